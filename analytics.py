@@ -0,0 +1,151 @@
+from datetime import datetime
+
+import numpy as np
+
+import database
+import dataversion
+from models import db, CareEvent, Plant
+from pagecache import MemoryBackend
+
+# A watering counts as on time if it came no later than this fraction past
+# the plant's watering frequency.
+ON_TIME_TOLERANCE = 0.25
+# Weight of the most recent interval in the smoothed prediction.
+SMOOTHING = 0.3
+DAY = np.timedelta64(1, "D")
+
+_cache = MemoryBackend(maxsize=256, ttl=24 * 60 * 60)
+
+
+def _group_sums(index, values, size):
+    return np.bincount(index, weights=values, minlength=size)
+
+
+def watering_analytics(plant_ids, frequencies, event_plant_ids, event_dates):
+    """Compute watering habits for many plants in one vectorized pass.
+
+    ``event_plant_ids`` and ``event_dates`` describe every watering event,
+    sorted by plant and then date. Returns a dict of arrays aligned with
+    ``plant_ids``, which must be sorted.
+    """
+    n = len(plant_ids)
+    frequencies = np.asarray(frequencies, dtype=float)
+    group = np.searchsorted(plant_ids, event_plant_ids)
+    waterings = np.bincount(group, minlength=n)
+
+    last = np.full(n, np.datetime64("NaT"), dtype="datetime64[us]")
+    if len(group):
+        # Events are sorted, so the last event of each plant is where the
+        # next plant's events begin.
+        ends = np.flatnonzero(np.append(group[1:] != group[:-1], True))
+        last[group[ends]] = event_dates[ends]
+
+    same_plant = group[1:] == group[:-1]
+    intervals = (np.diff(event_dates) / DAY)[same_plant]
+    interval_group = group[1:][same_plant]
+    interval_count = np.bincount(interval_group, minlength=n)
+
+    on_time = intervals <= frequencies[interval_group] * (1 + ON_TIME_TOLERANCE)
+    on_time_count = _group_sums(interval_group, on_time, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_interval = _group_sums(interval_group, intervals, n) / interval_count
+        adherence = on_time_count / interval_count
+
+    # Exponential smoothing seeded with the configured frequency: the k-th
+    # most recent interval gets weight a(1-a)^k and the frequency keeps the
+    # remaining (1-a)^n, so plants with little history lean on it.
+    if len(interval_group):
+        group_end = np.cumsum(interval_count)[interval_group] - 1
+        age = group_end - np.arange(len(interval_group))
+    else:
+        age = np.zeros(0, dtype=int)
+    weights = SMOOTHING * (1 - SMOOTHING) ** age
+    predicted_interval = _group_sums(interval_group, weights * intervals, n) + (
+        (1 - SMOOTHING) ** interval_count * frequencies
+    )
+    predicted_next = last + (predicted_interval * DAY).astype("timedelta64[us]")
+
+    return {
+        "waterings": waterings,
+        "mean_interval": mean_interval,
+        "adherence": adherence,
+        "predicted_interval": predicted_interval,
+        "last_watered": last,
+        "predicted_next": predicted_next,
+        "on_time": int(on_time.sum()),
+        "intervals": len(intervals),
+    }
+
+
+def _date(value):
+    if np.isnat(value):
+        return None
+    return value.astype(datetime).isoformat(timespec="seconds") + "Z"
+
+
+def _number(value, digits):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def user_watering_report(user_id):
+    """Watering habits and predictions for all of a user's plants.
+
+    Cached until the user's data version changes, which every care event does.
+    """
+    session = database.read_session()
+    version = dataversion.current(user_id, session)
+    key = f"{user_id}:{version}"
+    report = _cache.get(key)
+    if report is not None:
+        return report
+
+    plants = session.execute(
+        db.select(
+            Plant.id, Plant.name, Plant.watering_frequency, Plant.next_watering_due
+        )
+        .where(Plant.user_id == user_id)
+        .order_by(Plant.id)
+    ).all()
+    events = session.execute(
+        db.select(CareEvent.plant_id, CareEvent.event_date)
+        .join(Plant)
+        .where(Plant.user_id == user_id, CareEvent.event_type == "watering")
+        .order_by(CareEvent.plant_id, CareEvent.event_date)
+    ).all()
+
+    result = watering_analytics(
+        np.array([plant.id for plant in plants], dtype=np.int64),
+        [plant.watering_frequency for plant in plants],
+        np.array([event.plant_id for event in events], dtype=np.int64),
+        np.array([event.event_date for event in events], dtype="datetime64[us]"),
+    )
+    report = {
+        "adherence": (
+            round(result["on_time"] / result["intervals"], 3)
+            if result["intervals"]
+            else None
+        ),
+        "plants": [
+            {
+                "id": plant.id,
+                "name": plant.name,
+                "watering_frequency": plant.watering_frequency,
+                "waterings": int(result["waterings"][i]),
+                "mean_interval_days": _number(result["mean_interval"][i], 1),
+                "adherence": _number(result["adherence"][i], 3),
+                "predicted_interval_days": round(
+                    float(result["predicted_interval"][i]), 1
+                ),
+                "last_watered": _date(result["last_watered"][i]),
+                # Never-watered plants fall back to the frequency-based date.
+                "predicted_next_watering": _date(result["predicted_next"][i])
+                or (
+                    plant.next_watering_due
+                    and plant.next_watering_due.isoformat(timespec="seconds") + "Z"
+                ),
+            }
+            for i, plant in enumerate(plants)
+        ],
+    }
+    _cache.set(key, report)
+    return report
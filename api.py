@@ -0,0 +1,259 @@
+from functools import wraps
+
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+from flask_login import current_user, login_required
+from werkzeug.exceptions import HTTPException
+
+import analytics
+import database
+import dataversion
+import search
+import uploads
+from extensions import metrics
+from models import db, CareEvent, JournalEntry, Plant
+from pagination import InvalidCursor, id_page, keyset_page, offset_page
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+@api.errorhandler(HTTPException)
+def json_error(exc):
+    return jsonify(error=exc.name, message=exc.description), exc.code
+
+
+def _timestamp(value):
+    return value.isoformat(timespec="seconds") + "Z" if value else None
+
+
+def _compact(data):
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def serialize_plant(plant):
+    return _compact(
+        {
+            "id": plant.id,
+            "name": plant.name,
+            "species": plant.species,
+            "location": plant.location,
+            "photo": plant.photo_filename
+            and url_for("main.uploaded_file", filename=plant.photo_filename),
+            "watering_frequency": plant.watering_frequency,
+            "sunlight": plant.sunlight_preference,
+            "last_watered": _timestamp(plant.last_watered),
+            "next_watering_due": _timestamp(plant.next_watering_due),
+        }
+    )
+
+
+def serialize_care_event(event):
+    return _compact(
+        {
+            "id": event.id,
+            "type": event.event_type,
+            "date": _timestamp(event.event_date),
+            "notes": event.notes,
+        }
+    )
+
+
+def serialize_journal_entry(entry):
+    return _compact(
+        {
+            "id": entry.id,
+            "date": _timestamp(entry.entry_date),
+            "content": entry.content,
+            "photo": entry.photo_filename
+            and url_for("main.uploaded_file", filename=entry.photo_filename),
+        }
+    )
+
+
+def conditional(view):
+    """Answer with 304 when the client already has this user's current data.
+
+    The weak ETag combines the user's data version with the request path and
+    query, so the check costs a single primary-key lookup and never touches
+    the plant tables.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Read the version from the same session as the data so a lagging
+        # replica never serves old data under a new ETag.
+        version = dataversion.current(current_user.id, database.read_session())
+        etag = f"u{current_user.id}-v{version}-{request.full_path}"
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = jsonify(view(*args, **kwargs))
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
+
+
+def _owned_plant(id):
+    plant = database.read_session().get(Plant, id)
+    if plant is None or plant.user_id != current_user.id:
+        abort(404)
+    return plant
+
+
+def _timeline(query, sort_column, id_column, serializer):
+    try:
+        rows, cursor = keyset_page(
+            query,
+            sort_column,
+            id_column,
+            cursor=request.args.get("before"),
+            limit=current_app.config["TIMELINE_PAGE_SIZE"],
+        )
+    except InvalidCursor:
+        abort(400, "Invalid cursor.")
+    return {"items": [serializer(row) for row in rows], "next": cursor}
+
+
+@api.route("/plants")
+@login_required
+@conditional
+def plants():
+    q = request.args.get("q", "").strip()
+    query = search.apply_search(
+        database.read_session().query(Plant).filter_by(user_id=current_user.id),
+        current_user.id,
+        q=q,
+        species=request.args.get("species", "").strip(),
+        location=request.args.get("location", "").strip(),
+        backend=search.current_backend(),
+    )
+    after = request.args.get("after")
+    limit = current_app.config["DASHBOARD_PAGE_SIZE"]
+    try:
+        if search.is_ranked(q, search.current_backend()):
+            # Relevance has no column to seek on, as on the dashboard.
+            rows, cursor = offset_page(query, after, limit)
+        else:
+            rows, cursor = id_page(query, Plant.id, after, limit)
+    except InvalidCursor:
+        abort(400, "Invalid cursor.")
+    return {"plants": [serialize_plant(plant) for plant in rows], "next": cursor}
+
+
+@api.route("/plants/<int:id>")
+@login_required
+@conditional
+def plant(id):
+    return {"plant": serialize_plant(_owned_plant(id))}
+
+
+@api.route("/plants/<int:id>/care_events")
+@login_required
+@conditional
+def care_events(id):
+    _owned_plant(id)
+    return _timeline(
+        database.read_session().query(CareEvent).filter_by(plant_id=id),
+        CareEvent.event_date,
+        CareEvent.id,
+        serialize_care_event,
+    )
+
+
+@api.route("/plants/<int:id>/journal_entries")
+@login_required
+@conditional
+def journal_entries(id):
+    _owned_plant(id)
+    return _timeline(
+        database.read_session().query(JournalEntry).filter_by(plant_id=id),
+        JournalEntry.entry_date,
+        JournalEntry.id,
+        serialize_journal_entry,
+    )
+
+
+@api.route("/analytics/watering")
+@login_required
+@conditional
+def watering_report():
+    """Watering adherence and predicted next watering for every plant."""
+    return analytics.user_watering_report(current_user.id)
+
+
+ALLOWED_PHOTO_EXTENSIONS = {"jpg", "jpeg", "png", "gif"}
+
+
+def serialize_upload(upload):
+    return {
+        "id": upload.id,
+        "size": upload.size,
+        "offset": upload.offset,
+        "complete": upload.complete,
+        "chunk_size": current_app.config["UPLOAD_CHUNK_SIZE"],
+    }
+
+
+def _owned_upload(upload_id):
+    upload = uploads.get_pending(upload_id, current_user.id)
+    if upload is None:
+        abort(404)
+    return upload
+
+
+@api.route("/uploads", methods=["POST"])
+@login_required
+def start_upload():
+    """Begin a resumable photo upload, declaring its size and SHA-256."""
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get("filename") or "")
+    size = data.get("size")
+    sha256 = str(data.get("sha256") or "").lower()
+    if filename.rsplit(".", 1)[-1].lower() not in ALLOWED_PHOTO_EXTENSIONS:
+        abort(400, "Images only!")
+    if (
+        not isinstance(size, int)
+        or not 0 < size <= current_app.config["MAX_UPLOAD_SIZE"]
+    ):
+        abort(400, "Invalid size.")
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        abort(400, "Invalid sha256.")
+
+    upload = uploads.start_pending(
+        current_app.config["UPLOAD_FOLDER"], current_user.id, filename, size, sha256
+    )
+    db.session.commit()
+    response = jsonify(serialize_upload(upload))
+    response.status_code = 201
+    response.headers["Location"] = url_for(".upload_status", upload_id=upload.id)
+    return response
+
+
+@api.route("/uploads/<upload_id>")
+@login_required
+def upload_status(upload_id):
+    """How much of an upload the server has, so a client can resume."""
+    return serialize_upload(_owned_upload(upload_id))
+
+
+@api.route("/uploads/<upload_id>", methods=["PATCH"])
+@login_required
+def upload_chunk(upload_id):
+    """Append the request body at the ``Upload-Offset`` header's position."""
+    upload = _owned_upload(upload_id)
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        abort(400, "Upload-Offset header is required.")
+    try:
+        received = uploads.append_chunk(
+            current_app.config["UPLOAD_FOLDER"], upload, offset, request.stream
+        )
+    except uploads.UploadError as exc:
+        db.session.commit()
+        abort(exc.status, str(exc))
+    db.session.commit()
+    metrics.inc("upload_bytes_total", received - offset, via="chunked")
+    return serialize_upload(upload)
@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from functools import partial
+
+from flask import current_app, request, send_from_directory
+
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _fingerprint(path, content):
+    stem, ext = posixpath.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _rewrite_css(path, content, manifest):
+    """Point relative ``url()`` references at already fingerprinted files."""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(("/", "data:", "http:", "https:", "#")):
+            return match.group(0)
+        target, _, suffix = target.partition("?")
+        logical = posixpath.normpath(posixpath.join(base, target))
+        if logical not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[logical], base)
+        return f"url({quote}{hashed}{'?' + suffix if suffix else ''}{quote})"
+
+    return CSS_URL.sub(replace, content.decode()).encode()
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def build(static_folder, skip=()):
+    """Copy static files to ``dist/`` under content-hashed names.
+
+    Text assets also get ``.gz`` and ``.br`` siblings. Returns the manifest
+    mapping logical to hashed paths.
+    """
+    # Only the build compresses, so web workers never load brotli.
+    import brotli
+
+    skip = {DIST_DIR, *skip}
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [name for name in dirs if name not in skip]
+        for name in files:
+            full = os.path.join(root, name)
+            sources.append(os.path.relpath(full, static_folder).replace(os.sep, "/"))
+
+    # Stylesheets go last so the files they reference already have hashes.
+    sources.sort(key=lambda path: (path.endswith(".css"), path))
+    manifest = {}
+    dist = os.path.join(static_folder, DIST_DIR)
+    for path in sources:
+        with open(os.path.join(static_folder, path), "rb") as f:
+            content = f.read()
+        if path.endswith(".css"):
+            content = _rewrite_css(path, content, manifest)
+        hashed = _fingerprint(path, content)
+        manifest[path] = hashed
+
+        target = os.path.join(dist, hashed)
+        encoders = {"": bytes}
+        if posixpath.splitext(path)[1] in COMPRESSIBLE:
+            encoders[".gz"] = partial(gzip.compress, compresslevel=9, mtime=0)
+            encoders[".br"] = brotli.compress
+        # Each variant is checked on its own, so a rebuild fills in any that an
+        # earlier build did not write.
+        for suffix, encode in encoders.items():
+            if not os.path.exists(target + suffix):
+                _write(target + suffix, encode(content))
+
+    _write(
+        os.path.join(dist, MANIFEST),
+        json.dumps(manifest, indent=2, sort_keys=True).encode(),
+    )
+    return manifest
+
+
+class Assets:
+    """Serve fingerprinted, precompressed static files built by ``build``.
+
+    ``url_for("static", filename=...)`` emits the hashed name whenever a
+    manifest exists, so templates need no changes. In debug mode the original
+    files are used so edits show up without a rebuild.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.load()
+        app.url_defaults(self._hashed_url)
+        self._static_view = app.view_functions["static"]
+        app.view_functions["static"] = self._serve
+        app.extensions["assets"] = self
+
+    def load(self):
+        path = os.path.join(self.app.static_folder, DIST_DIR, MANIFEST)
+        try:
+            with open(path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def _hashed_url(self, endpoint, values):
+        if endpoint != "static" or current_app.debug:
+            return
+        hashed = self.manifest.get(values.get("filename"))
+        if hashed:
+            values["filename"] = f"{DIST_DIR}/{hashed}"
+
+    def _serve(self, filename):
+        if not filename.startswith(DIST_DIR + "/"):
+            return self._static_view(filename=filename)
+
+        directory = self.app.static_folder
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        compressible = posixpath.splitext(filename)[1] in COMPRESSIBLE
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            # A quality of 0 ("br;q=0") means the browser refuses it.
+            if request.accept_encodings[candidate] > 0 and os.path.isfile(
+                os.path.join(directory, filename + suffix)
+            ):
+                encoding, filename = candidate, filename + suffix
+                break
+
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if compressible:
+            response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
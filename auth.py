@@ -0,0 +1,84 @@
+from flask import (
+    Blueprint,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
+from flask_login import current_user, login_required, login_user, logout_user
+
+import dataversion
+import rebalance
+from extensions import login_manager, user_cache
+from forms import LoginForm, RegistrationForm, SettingsForm
+from models import db, User
+
+auth = Blueprint("auth", __name__)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return user_cache.get(int(user_id))
+
+
+@auth.route("/register", methods=["GET", "POST"])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for("main.dashboard"))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        user = User(username=form.username.data, email=form.email.data)
+        user.set_password(form.password.data)
+        user.shard = rebalance.assign_shard()
+        db.session.add(user)
+        db.session.commit()
+        flash("Congratulations, you are now registered!", "success")
+        return redirect(url_for("auth.login"))
+    return render_template("register.html", form=form)
+
+
+@auth.route("/login", methods=["GET", "POST"])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for("main.dashboard"))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        if user and user.check_password(form.password.data):
+            login_user(user)
+            flash("Login successful!", "success")
+            next_page = request.args.get("next")
+            return (
+                redirect(next_page)
+                if next_page
+                else redirect(url_for("main.dashboard"))
+            )
+        else:
+            flash("Invalid username or password", "danger")
+    return render_template("login.html", form=form)
+
+
+@auth.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    flash("You have been logged out.", "info")
+    return redirect(url_for("auth.login"))
+
+
+@auth.route("/settings", methods=["GET", "POST"])
+@login_required
+def settings():
+    form = SettingsForm(obj=current_user)
+    if form.validate_on_submit():
+        current_user.timezone = form.timezone.data
+        # Cached pages show times in the old zone.
+        dataversion.bump(current_user.id)
+        db.session.commit()
+        flash("Settings saved.", "success")
+        return redirect(url_for("auth.settings"))
+    if form.timezone.data is None:
+        form.timezone.data = current_app.config["DEFAULT_TIMEZONE"]
+    return render_template("settings.html", form=form)
@@ -0,0 +1,459 @@
+"""Load-test the app against a generated database.
+
+    python benchmark.py --users 20 --plants 100 --events 30 --output bench.json
+    python benchmark.py --server --concurrency 16 --compare bench.json
+
+The database is a fresh SQLite file in a temporary directory unless
+``--database-url`` is given. Results are written as JSON so runs from
+different commits can be compared with ``--compare``.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+PASSWORD = "benchmark"
+SPECIES = [
+    "Monstera deliciosa",
+    "Ficus lyrata",
+    "Pothos aureus",
+    "Sansevieria trifasciata",
+    "Calathea orbifolia",
+    "Zamioculcas zamiifolia",
+    "Spathiphyllum wallisii",
+    "Philodendron hederaceum",
+    "Aloe vera",
+    "Nephrolepis exaltata",
+]
+LOCATIONS = ["Living Room", "Kitchen", "Bedroom", "Balcony", "Office", "Bathroom"]
+WORDS = ["leaf", "repotted", "yellow", "growth", "new", "root", "bloom", "pest"]
+SUNLIGHT = ["full_sun", "partial_shade", "full_shade"]
+EVENT_TYPES = ["watering", "watering", "watering", "fertilizing", "pruning"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--plants", type=int, default=50, help="plants per user")
+    parser.add_argument("--events", type=int, default=20, help="events per plant")
+    parser.add_argument("--entries", type=int, default=5, help="entries per plant")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--reminder-runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="drive a local threaded WSGI server over HTTP instead of the test client",
+    )
+    parser.add_argument(
+        "--page-cache",
+        choices=["memory", "filesystem", "none"],
+        default="none",
+        help="page cache backend; 'none' measures uncached rendering",
+    )
+    parser.add_argument("--database-url")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    return parser.parse_args(argv)
+
+
+def generate(app, users, plants, events, entries, seed):
+    """Fill the database with a reproducible collection; return the users."""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    import carestats
+    from models import db, CareEvent, JournalEntry, Plant, User
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(PASSWORD)
+    generated = []
+    with app.app_context():
+        for u in range(users):
+            username = f"bench{u}"
+            user = User(
+                username=username,
+                email=f"{username}@example.com",
+                password_hash=password_hash,
+            )
+            db.session.add(user)
+            db.session.flush()
+
+            plant_rows = []
+            for p in range(plants):
+                frequency = rng.randint(2, 14)
+                plant_rows.append(
+                    {
+                        "user_id": user.id,
+                        "name": f"{rng.choice(SPECIES).split()[0]} {p}",
+                        "species": rng.choice(SPECIES),
+                        "location": rng.choice(LOCATIONS),
+                        "watering_frequency": frequency,
+                        "sunlight_preference": rng.choice(SUNLIGHT),
+                        "date_added": now - timedelta(days=rng.randint(30, 730)),
+                    }
+                )
+            plant_ids = db.session.scalars(
+                insert(Plant).returning(Plant.id, sort_by_parameter_order=True),
+                plant_rows,
+            ).all()
+
+            event_rows, entry_rows, plant_updates = [], [], []
+            for plant_id, row in zip(plant_ids, plant_rows):
+                last_watered = None
+                for _ in range(events):
+                    event_type = rng.choice(EVENT_TYPES)
+                    event_date = now - timedelta(minutes=rng.randint(0, 365 * 1440))
+                    event_rows.append(
+                        {
+                            "plant_id": plant_id,
+                            "event_type": event_type,
+                            "event_date": event_date,
+                            "notes": " ".join(rng.sample(WORDS, 3)),
+                        }
+                    )
+                    if event_type == "watering":
+                        last_watered = max(last_watered or event_date, event_date)
+                for _ in range(entries):
+                    entry_rows.append(
+                        {
+                            "plant_id": plant_id,
+                            "entry_date": now
+                            - timedelta(minutes=rng.randint(0, 365 * 1440)),
+                            "content": " ".join(rng.choices(WORDS, k=12)),
+                        }
+                    )
+                plant = Plant(
+                    last_watered=last_watered,
+                    watering_frequency=row["watering_frequency"],
+                )
+                plant.update_next_watering_due()
+                plant_updates.append(
+                    {
+                        "id": plant_id,
+                        "last_watered": plant.last_watered,
+                        "next_watering_due": plant.next_watering_due,
+                    }
+                )
+            if event_rows:
+                db.session.execute(insert(CareEvent), event_rows)
+            if entry_rows:
+                db.session.execute(insert(JournalEntry), entry_rows)
+            db.session.execute(db.update(Plant), plant_updates)
+            db.session.commit()
+            generated.append((username, list(plant_ids)))
+
+        carestats.rebuild()
+        db.session.commit()
+    return generated
+
+
+def scenarios(plant_ids, rng):
+    """Yield ``(label, path)`` requests in a realistic mix."""
+    weighted = [
+        (4, lambda: ("dashboard", "/dashboard")),
+        (1, lambda: ("dashboard?all", "/dashboard?all=1")),
+        (1, lambda: ("dashboard?q", f"/dashboard?q={rng.choice(WORDS)}")),
+        (
+            1,
+            lambda: (
+                "dashboard?species",
+                "/dashboard?species="
+                + urllib.parse.quote(rng.choice(SPECIES).split()[0]),
+            ),
+        ),
+        (
+            1,
+            lambda: (
+                "dashboard?location",
+                "/dashboard?location=" + urllib.parse.quote(rng.choice(LOCATIONS)),
+            ),
+        ),
+        (4, lambda: ("plant_detail", f"/plant/{rng.choice(plant_ids)}")),
+        (1, lambda: ("api.plants", "/api/v1/plants")),
+    ]
+    weights = [weight for weight, _ in weighted]
+    makers = [maker for _, maker in weighted]
+    while True:
+        yield rng.choices(makers, weights)[0]()
+
+
+class TestClientSession:
+    def __init__(self, app, username):
+        self.client = app.test_client()
+        self.client.post("/login", data={"username": username, "password": PASSWORD})
+
+    def get(self, path):
+        response = self.client.get(path)
+        # Streamed pages are only rendered as their body is read.
+        response.get_data()
+        response.close()
+        return response.status_code, response.headers
+
+
+class HTTPSession:
+    def __init__(self, base_url, username):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        data = urllib.parse.urlencode({"username": username, "password": PASSWORD})
+        self.opener.open(self.base_url + "/login", data.encode()).read()
+
+    def get(self, path):
+        try:
+            with self.opener.open(self.base_url + path) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.headers
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, wall_seconds):
+    routes = {}
+    for label, rows in sorted(samples.items()):
+        latencies = sorted(ms for ms, _, _, _ in rows)
+        queries = [q for _, _, q, _ in rows if q is not None]
+        db_ms = [t for _, _, _, t in rows if t is not None]
+        routes[label] = {
+            "requests": len(rows),
+            "errors": sum(status >= 400 for _, status, _, _ in rows),
+            "throughput_rps": round(len(rows) / wall_seconds, 1),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "queries_per_request": (
+                round(statistics.fmean(queries), 1) if queries else None
+            ),
+            "db_ms_per_request": round(statistics.fmean(db_ms), 2) if db_ms else None,
+        }
+    return routes
+
+
+def run_load(session_factory, users, total, concurrency, seed):
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    per_worker = [total // concurrency] * concurrency
+    for i in range(total % concurrency):
+        per_worker[i] += 1
+
+    def worker(index, count):
+        rng = random.Random(seed * 1000 + index)
+        username, plant_ids = users[index % len(users)]
+        session = session_factory(username)
+        requests = scenarios(plant_ids, rng)
+        for _ in range(count):
+            label, path = next(requests)
+            started = time.perf_counter()
+            status, headers = session.get(path)
+            elapsed = (time.perf_counter() - started) * 1000
+            query_count = headers.get("X-Query-Count")
+            query_ms = headers.get("X-Query-Time-Ms")
+            with lock:
+                samples[label].append(
+                    (
+                        elapsed,
+                        status,
+                        int(query_count) if query_count is not None else None,
+                        float(query_ms) if query_ms is not None else None,
+                    )
+                )
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [
+            pool.submit(worker, index, count) for index, count in enumerate(per_worker)
+        ]:
+            future.result()
+    wall = time.perf_counter() - started
+    return samples, wall
+
+
+def bench_reminders(app, runs):
+    from sqlalchemy import event
+
+    from models import db
+    from tasks import check_watering_reminders
+
+    with app.app_context():
+        engine = db.engine
+    counter = {"queries": 0}
+
+    def count(*args):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    timings = []
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            with app.app_context():
+                check_watering_reminders()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    timings.sort()
+    return {
+        "runs": runs,
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "queries_per_run": round(counter["queries"] / runs, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results, baseline=None):
+    base_routes = (baseline or {}).get("routes", {})
+    print(
+        f"{'route':<20}{'reqs':>7}{'err':>5}{'rps':>8}{'p50':>9}{'p95':>9}"
+        f"{'p99':>9}{'queries':>9}{'db ms':>8}"
+    )
+    for label, row in results["routes"].items():
+        line = (
+            f"{label:<20}{row['requests']:>7}{row['errors']:>5}"
+            f"{row['throughput_rps']:>8}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+            f"{row['p99_ms']:>9}{row['queries_per_request'] or '-':>9}"
+            f"{row['db_ms_per_request'] or '-':>8}"
+        )
+        base = base_routes.get(label)
+        if base:
+            change = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+            line += f"  p95 {change:+.0f}% vs {(baseline or {}).get('commit')}"
+        print(line)
+    reminders = results["check_watering_reminders"]
+    print(
+        f"check_watering_reminders: {reminders['runs']} runs, "
+        f"p50 {reminders['p50_ms']} ms, p95 {reminders['p95_ms']} ms, "
+        f"{reminders['queries_per_run']} queries/run"
+    )
+    print(
+        f"total: {results['total_requests']} requests in "
+        f"{results['wall_seconds']} s ({results['throughput_rps']} req/s)"
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="houseplants-bench-")
+    # The app factory reads its configuration from the environment.
+    os.environ["DATABASE_URL"] = args.database_url or (
+        "sqlite:///" + os.path.join(workdir, "bench.db")
+    )
+    os.environ["SQL_PROFILING"] = "1"
+    os.environ["PAGE_CACHE_BACKEND"] = args.page_cache
+    # Keep benchmark traffic out of the real service's metrics.
+    os.environ["METRICS_DIR"] = os.path.join(workdir, "metrics")
+    os.environ.setdefault("REMINDER_TRANSPORT", "console")
+
+    from werkzeug.serving import make_server
+
+    from flask_migrate import upgrade
+
+    from app import create_app
+    from extensions import bind_migrate
+
+    app = create_app({"WTF_CSRF_ENABLED": False})
+    bind_migrate(app)
+    with app.app_context():
+        upgrade()
+
+    started = time.perf_counter()
+    users = generate(app, args.users, args.plants, args.events, args.entries, args.seed)
+    print(
+        f"Generated {args.users} users x {args.plants} plants x "
+        f"{args.events} events + {args.entries} entries "
+        f"in {time.perf_counter() - started:.1f} s",
+        file=sys.stderr,
+    )
+
+    server = None
+    if args.server:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        def session_factory(username):
+            return HTTPSession(base_url, username)
+
+    else:
+
+        def session_factory(username):
+            return TestClientSession(app, username)
+
+    try:
+        samples, wall = run_load(
+            session_factory, users, args.requests, args.concurrency, args.seed
+        )
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "total_requests": args.requests,
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(args.requests / wall, 1),
+        "routes": summarize(samples, wall),
+        "check_watering_reminders": bench_reminders(app, args.reminder_runs),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from sqlalchemy import case, func, insert, select
+
+from models import db, CareEvent, Plant, PlantCareStats
+
+EVENT_TYPES = ("watering", "fertilizing", "pruning", "repotting")
+
+
+def _count_column(event_type):
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown care event type: {event_type!r}")
+    return getattr(PlantCareStats, f"{event_type}_count")
+
+
+def record_event(plant_id, event_type, event_date):
+    """Fold a new care event into the plant's rollup, in the caller's transaction."""
+    column = _count_column(event_type)
+    values = {column.key: column + 1}
+    if event_type == "watering":
+        values["first_watered"] = func.coalesce(
+            PlantCareStats.first_watered, event_date
+        )
+        values["last_watered"] = case(
+            (PlantCareStats.last_watered > event_date, PlantCareStats.last_watered),
+            else_=event_date,
+        )
+
+    result = db.session.execute(
+        db.update(PlantCareStats)
+        .where(PlantCareStats.plant_id == plant_id)
+        .values(values)
+    )
+    if result.rowcount == 0:
+        stats = PlantCareStats(
+            plant_id=plant_id,
+            watering_count=0,
+            fertilizing_count=0,
+            pruning_count=0,
+            repotting_count=0,
+        )
+        setattr(stats, column.key, 1)
+        if event_type == "watering":
+            stats.first_watered = stats.last_watered = event_date
+        db.session.add(stats)
+
+
+def remove_event(event):
+    """Take a deleted care event back out of its plant's rollup.
+
+    Call after the delete has been flushed so the first/last watering dates
+    can be recomputed from the remaining events.
+    """
+    column = _count_column(event.event_type)
+    values = {column.key: column - 1}
+    if event.event_type == "watering":
+        is_remaining_watering = (CareEvent.plant_id == event.plant_id) & (
+            CareEvent.event_type == "watering"
+        )
+        values["first_watered"] = (
+            select(func.min(CareEvent.event_date))
+            .where(is_remaining_watering)
+            .scalar_subquery()
+        )
+        values["last_watered"] = (
+            select(func.max(CareEvent.event_date))
+            .where(is_remaining_watering)
+            .scalar_subquery()
+        )
+    db.session.execute(
+        db.update(PlantCareStats)
+        .where(PlantCareStats.plant_id == event.plant_id)
+        .values(values)
+    )
+
+
+def rebuild(plant_ids=None):
+    """Recompute plants' rollups from the care_event table in bulk.
+
+    Covers every plant unless ``plant_ids`` is given. Runs in the caller's
+    transaction.
+    """
+    is_watering = CareEvent.event_type == "watering"
+    columns = [Plant.id] + [
+        func.count(case((CareEvent.event_type == event_type, 1)))
+        for event_type in EVENT_TYPES
+    ]
+    columns += [
+        func.min(case((is_watering, CareEvent.event_date))),
+        func.max(case((is_watering, CareEvent.event_date))),
+    ]
+    rollup = (
+        select(*columns)
+        .select_from(Plant)
+        .outerjoin(CareEvent, CareEvent.plant_id == Plant.id)
+        .group_by(Plant.id)
+    )
+    stale = db.delete(PlantCareStats)
+    if plant_ids is not None:
+        plant_ids = list(plant_ids)
+        rollup = rollup.where(Plant.id.in_(plant_ids))
+        stale = stale.where(PlantCareStats.plant_id.in_(plant_ids))
+    db.session.execute(stale)
+    result = db.session.execute(
+        insert(PlantCareStats).from_select(
+            ["plant_id"]
+            + [f"{event_type}_count" for event_type in EVENT_TYPES]
+            + ["first_watered", "last_watered"],
+            rollup,
+        )
+    )
+    return result.rowcount
@@ -0,0 +1,239 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, current_app
+
+import assets
+import carestats
+import outbox
+import rebalance
+import search
+import sharding
+import tasks
+import transfer
+from images import generate_derivatives, iter_uploads
+from models import db, Plant, User
+from uploads import expire_pending, register_untracked
+
+# Registered like a blueprint only for its CLI commands, which stay top-level
+# (``flask sweep-uploads``) rather than under a group.
+commands = Blueprint("commands", __name__, cli_group=None)
+
+
+@commands.cli.command("recompute-watering-due")
+def recompute_watering_due():
+    """Backfill Plant.next_watering_due for rows created before it existed."""
+    updated = 0
+    for index in sharding.shards():
+        with sharding.use_shard(index):
+            last_id = 0
+            while True:
+                plants = (
+                    Plant.query.filter(Plant.id > last_id)
+                    .order_by(Plant.id)
+                    .limit(tasks.REMINDER_BATCH_SIZE)
+                    .all()
+                )
+                if not plants:
+                    break
+                for plant in plants:
+                    plant.update_next_watering_due()
+                db.session.commit()
+                updated += len(plants)
+                last_id = plants[-1].id
+    print(f"Recomputed next watering date for {updated} plants.")
+
+
+@commands.cli.command("generate-thumbnails")
+@click.option("--overwrite", is_flag=True, help="Regenerate existing derivatives.")
+def generate_thumbnails(overwrite):
+    """Backfill thumbnail and medium derivatives for existing uploads."""
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    created = failed = 0
+    with ThreadPoolExecutor(max_workers=current_app.config["IMAGE_WORKERS"]) as pool:
+        futures = {
+            pool.submit(generate_derivatives, upload_folder, name, overwrite): name
+            for name in iter_uploads(upload_folder)
+        }
+        for future, name in futures.items():
+            try:
+                created += future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"Skipped {name}: {exc}")
+    print(f"Generated {created} derivatives ({failed} uploads skipped).")
+
+
+@commands.cli.command("rebuild-care-stats")
+def rebuild_care_stats():
+    """Recompute the per-plant care statistics rollup from all care events."""
+    rebuilt = 0
+    for index in sharding.shards():
+        with sharding.use_shard(index):
+            rebuilt += carestats.rebuild()
+            db.session.commit()
+    print(f"Rebuilt care statistics for {rebuilt} plants.")
+
+
+@commands.cli.command("import-data")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user", "username", required=True, help="Owner of the imported data.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]))
+def import_data(path, username, fmt):
+    """Import plants, care events and journal entries from CSV or JSONL."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"No user named {username!r}.")
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    with (
+        sharding.use_shard(user.shard),
+        open(path, encoding="utf-8-sig", newline="") as stream,
+    ):
+        result = transfer.Importer(user.id).run(stream, fmt)
+    for error in result.errors:
+        print(f"Skipped {error}")
+    print(result)
+
+
+@commands.cli.command("export-data")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--user", "username", required=True, help="Owner of the data.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]))
+def export_data(path, username, fmt):
+    """Export a user's collection to CSV or JSONL."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"No user named {username!r}.")
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    with (
+        sharding.use_shard(user.shard),
+        open(path, "w", encoding="utf-8", newline="") as out,
+    ):
+        for chunk in transfer.write_records(transfer.export_records(user.id), fmt):
+            out.write(chunk)
+
+
+@commands.cli.command("deliver-reminders")
+@click.option("--once", is_flag=True, help="Drain the outbox and exit.")
+def deliver_reminders(once):
+    """Send queued reminders from the outbox."""
+    worker = outbox.DeliveryWorker(
+        outbox.transport_from_config(current_app.config),
+        concurrency=current_app.config["OUTBOX_CONCURRENCY"],
+    )
+    if once:
+        sent, failed = asyncio.run(worker.run_once())
+        print(f"Sent {sent} reminders; {failed} delivery attempts failed.")
+    else:
+        asyncio.run(worker.run())
+
+
+@commands.cli.command("prune-uploads")
+def prune_uploads():
+    """Discard resumable uploads that were never attached to a plant or entry."""
+    before = datetime.utcnow() - timedelta(
+        hours=current_app.config["PENDING_UPLOAD_TTL_HOURS"]
+    )
+    removed = 0
+    for index in sharding.shards():
+        with sharding.use_shard(index):
+            removed += expire_pending(current_app.config["UPLOAD_FOLDER"], before)
+    print(f"Discarded {removed} unfinished uploads.")
+
+
+@commands.cli.command("sweep-uploads")
+@click.option(
+    "--scan-disk",
+    is_flag=True,
+    help="First register uploads on disk that are not tracked yet.",
+)
+def sweep_uploads_command(scan_disk):
+    """Delete uploaded photos that no plant or journal entry refers to."""
+    if scan_disk:
+        registered = register_untracked(
+            current_app.config["UPLOAD_FOLDER"],
+            current_app.config["UPLOAD_SWEEP_BATCH_SIZE"],
+        )
+        print(f"Registered {registered} untracked uploads.")
+    print(f"Removed {tasks.sweep_uploads()} unreferenced uploads.")
+
+
+@commands.cli.command("move-user")
+@click.argument("username")
+@click.argument("shard", type=int)
+def move_user(username, shard):
+    """Move a user's plants, care history and journal to another shard."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"No user named {username!r}.")
+    if shard not in sharding.shards():
+        raise click.UsageError(f"There is no shard {shard}.")
+    moved = rebalance.move_user(user.id, shard)
+    print(f"Moved {username} and {moved} plants to shard {shard}.")
+
+
+@commands.cli.command("delete-user")
+@click.argument("username")
+@click.confirmation_option(prompt="Delete this user and all their data?")
+def delete_user(username):
+    """Delete a user with their plants, care history and journal."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"No user named {username!r}.")
+    deleted = rebalance.delete_user(user.id)
+    print(f"Deleted {username} and {deleted} plants.")
+
+
+@commands.cli.command("rebalance-shards")
+@click.option("--dry-run", is_flag=True, help="List the moves without making them.")
+def rebalance_shards(dry_run):
+    """Move users until every shard holds about the same number."""
+    moves = rebalance.plan_rebalance()
+    for user_id, shard in moves:
+        if not dry_run:
+            rebalance.move_user(user_id, shard)
+        print(f"User {user_id} -> shard {shard}")
+    print(f"{'Planned' if dry_run else 'Made'} {len(moves)} moves.")
+
+
+@commands.cli.command("build-assets")
+def build_assets():
+    """Fingerprint and precompress static files into static/dist/."""
+    uploads_dir = os.path.relpath(current_app.config["UPLOAD_FOLDER"], "static")
+    try:
+        manifest = assets.build(current_app.static_folder, skip=[uploads_dir])
+    except ImportError as exc:
+        raise click.ClickException(
+            f"{exc.name} is needed to precompress assets; install the project's "
+            "dependencies."
+        )
+    current_app.extensions["assets"].load()
+    print(f"Built {len(manifest)} static assets.")
+
+
+@commands.cli.command("clear-metrics")
+def clear_metrics():
+    """Forget the metrics of all processes; run while the service is stopped."""
+    if not current_app.config["METRICS_DIR"]:
+        raise click.ClickException("METRICS_DIR is not set, so no metrics are stored.")
+    removed = current_app.extensions["metrics"].clear()
+    print(f"Removed metrics of {removed} processes.")
+
+
+@commands.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    """Rebuild the full-text index from the plant and journal tables."""
+    search.rebuild()
+    print(f"Rebuilt {search.current_backend()} search index.")
+
+
+@commands.cli.command("run-scheduler")
+def run_scheduler():
+    """Run scheduled jobs; only the instance holding the leader lease runs them."""
+    # Imported here so web workers never load APScheduler.
+    import scheduler
+
+    scheduler.run(current_app._get_current_object())
@@ -0,0 +1,140 @@
+import os
+import time
+
+from flask import g, has_request_context, session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from models import db
+
+# After a request commits, that browser reads from the primary for this many
+# seconds so replication lag never hides the user's own change.
+READ_YOUR_WRITES_SECONDS = 5
+
+
+def configure(app):
+    """Build the engine settings from the environment before ``db.init_app``.
+
+    Values already in ``app.config`` win over the environment.
+    """
+    url = app.config.setdefault(
+        "SQLALCHEMY_DATABASE_URI",
+        os.environ.get("DATABASE_URL", "sqlite:///houseplants.db"),
+    )
+    replica_url = os.environ.get("DATABASE_REPLICA_URL")
+    app.config.setdefault(
+        "SQLITE_BUSY_TIMEOUT_MS", int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    )
+    app.config.setdefault(
+        "SQLITE_SYNCHRONOUS", os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    )
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(url))
+    shard_urls = app.config.setdefault(
+        "DATABASE_SHARD_URLS",
+        [item for item in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if item],
+    )
+    binds = {}
+    # A shard whose URL is the main database's shares its engine, which lets
+    # an existing database become shard 0 without moving anyone.
+    app.config["SHARD_BINDS"] = []
+    for index, shard_url in enumerate(shard_urls):
+        key = None if shard_url == url else f"shard{index}"
+        if key is not None:
+            binds[key] = dict(engine_options(shard_url), url=shard_url)
+        app.config["SHARD_BINDS"].append(key)
+    if replica_url:
+        if shard_urls:
+            raise ValueError(
+                "DATABASE_REPLICA_URL cannot be combined with DATABASE_SHARD_URLS"
+            )
+        binds["replica"] = dict(engine_options(replica_url), url=replica_url)
+    if binds:
+        app.config.setdefault("SQLALCHEMY_BINDS", binds)
+
+
+def engine_options(url):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases use a single static connection; there is no pool
+        # to size.
+        return {}
+
+    options = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    }
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    return options
+
+
+def init_app(app):
+    """Apply per-connection settings and register the read session teardown."""
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name == "sqlite":
+                _install_sqlite_pragmas(app, engine, read_only=bind_key == "replica")
+
+    event.listen(Session, "after_commit", _remember_write)
+    app.teardown_appcontext(_close_read_session)
+
+
+def _install_sqlite_pragmas(app, engine, read_only):
+    statements = [
+        f"PRAGMA busy_timeout = {app.config['SQLITE_BUSY_TIMEOUT_MS']:d}",
+        f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}",
+        # Off by default in SQLite; ON DELETE CASCADE depends on it.
+        "PRAGMA foreign_keys = ON",
+    ]
+    if read_only:
+        statements.append("PRAGMA query_only = ON")
+    else:
+        # WAL lets readers carry on while a writer commits.
+        statements.insert(0, "PRAGMA journal_mode = WAL")
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+
+def _remember_write(committed):
+    if has_request_context() and committed is not g.get("read_session"):
+        session["primary_until"] = time.time() + READ_YOUR_WRITES_SECONDS
+
+
+def _use_replica():
+    return "replica" in db.engines and session.get("primary_until", 0) <= time.time()
+
+
+def read_session():
+    """Session for read-only work: the replica when configured, else ``db.session``."""
+    if not _use_replica():
+        return db.session
+    if "read_session" not in g:
+        g.read_session = Session(bind=db.engines["replica"], autoflush=False)
+    return g.read_session
+
+
+def stream_session():
+    """A new session like ``read_session()`` that outlives the request.
+
+    Both of those are closed when the request ends, before a streamed
+    response has been sent. The caller closes this one.
+    """
+    if not _use_replica():
+        return db.session.session_factory()
+    return Session(bind=db.engines["replica"], autoflush=False)
+
+
+def _close_read_session(exc):
+    read = g.pop("read_session", None)
+    if read is not None:
+        read.close()
@@ -0,0 +1,40 @@
+from werkzeug.exceptions import ServiceUnavailable
+
+import sharding
+from models import db, User, UserDataVersion
+
+
+def current(user_id, session=None):
+    """Return the user's data version; it changes whenever their data does."""
+    version = (session or db.session).scalar(
+        db.select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+    )
+    return version or 0
+
+
+def bump(user_id):
+    """Advance the user's data version, in the caller's transaction."""
+    result = db.session.execute(
+        db.update(UserDataVersion)
+        .where(UserDataVersion.user_id == user_id)
+        .values(version=UserDataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(UserDataVersion(user_id=user_id, version=1))
+    _check_shard(user_id)
+
+
+def _check_shard(user_id):
+    # A move bumps the version on the source shard while it points the
+    # directory at the target, so the update above waited for that switch. If
+    # one happened, the directory now points elsewhere and these writes would
+    # be lost. The directory is read on a connection of its own so the answer
+    # is not a snapshot from earlier in the request.
+    if not sharding.enabled():
+        return
+    with db.engine.connect() as conn:
+        shard = conn.scalar(db.select(User.shard).where(User.id == user_id))
+    if shard != sharding.current_shard():
+        raise ServiceUnavailable(
+            "Your plants were just moved. Please try again.", retry_after=1
+        )
@@ -0,0 +1,50 @@
+import click
+from flask import current_app
+from flask_login import LoginManager
+from flask_wtf.csrf import CSRFProtect
+
+import assets
+from metrics import Metrics
+from models import db
+from pagecache import PageCache
+from profiling import SQLProfiler
+from usercache import UserCache
+
+# Unbound extension instances; ``app.create_app`` binds them to an app.
+csrf = CSRFProtect()
+login_manager = LoginManager()
+metrics = Metrics()
+page_cache = PageCache()
+sql_profiler = SQLProfiler()
+static_assets = assets.Assets()
+user_cache = UserCache()
+
+
+def bind_migrate(app):
+    """Bind Flask-Migrate to ``app`` unless it already is.
+
+    Importing Alembic adds about 200 ms to start-up and only schema commands
+    need it, so this runs on first use rather than in ``create_app``.
+    """
+    if "migrate" not in app.extensions:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+    return app.extensions["migrate"]
+
+
+class MigrateCommands(click.Group):
+    """Stand-in for ``flask db`` that binds Flask-Migrate when first run."""
+
+    def __init__(self):
+        super().__init__("db", help="Perform database migrations.")
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Hand parsing and dispatch to Flask-Migrate's own group.
+        bind_migrate(current_app)
+        from flask_migrate.cli import db as group
+
+        return group.make_context(info_name, args, parent=parent, **extra)
+
+    def invoke(self, ctx):
+        return ctx.command.invoke(ctx)
@@ -1,13 +1,15 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import (
     StringField,
     PasswordField,
     SubmitField,
     IntegerField,
     SelectField,
+    SelectMultipleField,
     TextAreaField,
     DateTimeField,
+    HiddenField,
 )
 from wtforms.validators import (
     DataRequired,
@@ -16,7 +18,10 @@ from wtforms.validators import (
     ValidationError,
     NumberRange,
 )
-from models import User
+from flask_login import current_user
+from models import User, MAX_WATERING_FREQUENCY
+import timezones
+import uploads
 
 # --- Existing forms ---
 
@@ -51,7 +56,19 @@ class LoginForm(FlaskForm):
     submit = SubmitField("Sign In")
 
 
-class PlantForm(FlaskForm):
+class PhotoUploadMixin:
+    # Set by static/js/chunked-upload.js once a photo has been uploaded in
+    # resumable chunks; the file field is then left empty.
+    upload_id = HiddenField()
+
+    def validate_photo(self, field):
+        if self.upload_id.data:
+            upload = uploads.get_pending(self.upload_id.data, current_user.id)
+            if upload is None or not upload.complete:
+                raise ValidationError("The photo upload did not finish; try again.")
+
+
+class PlantForm(PhotoUploadMixin, FlaskForm):
     name = StringField("Plant Name", validators=[DataRequired()])
     species = StringField("Species", validators=[DataRequired()])
     location = StringField("Location", validators=[DataRequired()])
@@ -60,7 +77,8 @@ class PlantForm(FlaskForm):
         validators=[FileAllowed(["jpg", "jpeg", "png", "gif"], "Images only!")],
     )
     watering_frequency = IntegerField(
-        "Watering Frequency (days)", validators=[DataRequired(), NumberRange(min=1)]
+        "Watering Frequency (days)",
+        validators=[DataRequired(), NumberRange(min=1, max=MAX_WATERING_FREQUENCY)],
     )
     sunlight_preference = SelectField(
         "Sunlight Preference",
@@ -74,22 +92,40 @@ class PlantForm(FlaskForm):
     submit = SubmitField("Save Plant")
 
 
+CARE_EVENT_TYPES = [
+    ("watering", "Watering"),
+    ("fertilizing", "Fertilizing"),
+    ("pruning", "Pruning"),
+    ("repotting", "Repotting"),
+]
+
+
 class CareEventForm(FlaskForm):
     event_type = SelectField(
-        "Event Type",
-        choices=[
-            ("watering", "Watering"),
-            ("fertilizing", "Fertilizing"),
-            ("pruning", "Pruning"),
-            ("repotting", "Repotting"),
-        ],
-        validators=[DataRequired()],
+        "Event Type", choices=CARE_EVENT_TYPES, validators=[DataRequired()]
     )
     notes = TextAreaField("Notes")
     submit = SubmitField("Add Care Event")
 
 
-class JournalEntryForm(FlaskForm):
+class BulkCareForm(FlaskForm):
+    """One care event for many plants: the ticked ones, or all that match."""
+
+    event_type = SelectField(
+        "Event Type", choices=CARE_EVENT_TYPES, validators=[DataRequired()]
+    )
+    notes = TextAreaField("Notes")
+    # The checkboxes are rendered on the plant cards, so any id may come back;
+    # the route only acts on plants the user owns.
+    plant_ids = SelectMultipleField(coerce=int, choices=[], validate_choice=False)
+    q = HiddenField()
+    species = HiddenField()
+    location = HiddenField()
+    apply_selected = SubmitField("Apply to Selected")
+    apply_matching = SubmitField("Apply to All Matching")
+
+
+class JournalEntryForm(PhotoUploadMixin, FlaskForm):
     content = TextAreaField("Journal Entry", validators=[DataRequired()])
     photo = FileField(
         "Photo (optional)",
@@ -98,6 +134,26 @@ class JournalEntryForm(FlaskForm):
     submit = SubmitField("Add Entry")
 
 
+class ImportForm(FlaskForm):
+    file = FileField(
+        "CSV or JSONL file",
+        validators=[
+            FileRequired(),
+            FileAllowed(["csv", "jsonl"], "CSV or JSONL files only!"),
+        ],
+    )
+    submit = SubmitField("Import")
+
+
+class SettingsForm(FlaskForm):
+    timezone = SelectField("Timezone", validators=[DataRequired()])
+    submit = SubmitField("Save")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timezone.choices = timezones.choices()
+
+
 # --- New form for deleting a care event ---
 class DeleteEventForm(FlaskForm):
     """Empty form just for CSRF token in delete button"""
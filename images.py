@@ -0,0 +1,102 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# Width in pixels of each derivative generated for an uploaded photo.
+DERIVATIVE_WIDTHS = {"thumb": 400, "medium": 1000}
+DERIVATIVE_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+DERIVED_DIR = "derived"
+
+_executor = None
+
+
+def derivative_name(filename, size, ext):
+    stem, _ = os.path.splitext(filename)
+    return f"{DERIVED_DIR}/{stem}.{size}.{ext}"
+
+
+def generate_derivatives(upload_folder, filename, overwrite=False):
+    targets = {
+        (size, ext): os.path.join(upload_folder, derivative_name(filename, size, ext))
+        for size in DERIVATIVE_WIDTHS
+        for ext in DERIVATIVE_FORMATS
+    }
+    if not overwrite:
+        targets = {
+            key: path for key, path in targets.items() if not os.path.exists(path)
+        }
+    if not targets:
+        return 0
+
+    source = os.path.join(upload_folder, filename)
+    created = 0
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for size, width in DERIVATIVE_WIDTHS.items():
+            resized = image.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for ext, fmt in DERIVATIVE_FORMATS.items():
+                target = targets.get((size, ext))
+                if target is None:
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                out = resized.convert("RGB") if fmt == "JPEG" else resized
+                # Write beside the target and rename so a half-written file is
+                # never served, even if two workers race on the same upload.
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+                with os.fdopen(fd, "wb") as fp:
+                    out.save(fp, fmt, quality=82, optimize=True)
+                os.replace(tmp, target)
+                created += 1
+    return created
+
+
+def _get_executor(max_workers):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="thumbnails"
+        )
+    return _executor
+
+
+def _generate_logged(logger, upload_folder, filename):
+    try:
+        generate_derivatives(upload_folder, filename)
+    except Exception:
+        logger.exception("Could not generate derivatives for %s", filename)
+
+
+def schedule_derivatives(app, filename):
+    """Generate thumbnails for a saved upload without blocking the request."""
+    executor = _get_executor(app.config.get("IMAGE_WORKERS", 2))
+    return executor.submit(
+        _generate_logged, app.logger, app.config["UPLOAD_FOLDER"], filename
+    )
+
+
+def iter_uploads(upload_folder):
+    for root, dirs, files in os.walk(upload_folder):
+        if root == upload_folder and DERIVED_DIR in dirs:
+            dirs.remove(DERIVED_DIR)
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            yield os.path.relpath(os.path.join(root, name), upload_folder).replace(
+                os.sep, "/"
+            )
+
+
+def srcset(upload_url, upload_folder, filename, ext):
+    """Build a srcset for the derivatives that exist, or None if none do yet."""
+    candidates = []
+    for size, width in DERIVATIVE_WIDTHS.items():
+        name = derivative_name(filename, size, ext)
+        if os.path.exists(os.path.join(upload_folder, name)):
+            candidates.append(f"{upload_url(name)} {width}w")
+    return ", ".join(candidates) or None
@@ -0,0 +1,322 @@
+import atexit
+import bisect
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import (
+    abort,
+    current_app,
+    g,
+    got_request_exception,
+    request,
+    request_finished,
+    request_started,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds of the histogram buckets; everything larger lands in +Inf.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+SIZE_BUCKETS = tuple(2**n * 1024 for n in range(6, 15, 2))  # 64 KiB to 16 MiB
+
+# Name -> (type, help, histogram buckets).
+METRICS = {
+    "http_requests_total": (
+        "counter",
+        "Requests served, by endpoint, method and status.",
+        None,
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Time to produce a response, by endpoint and method.",
+        LATENCY_BUCKETS,
+    ),
+    "http_request_exceptions_total": (
+        "counter",
+        "Unhandled exceptions raised while serving requests, by endpoint and type.",
+        None,
+    ),
+    "upload_bytes_total": (
+        "counter",
+        "Photo bytes received, by how they were sent.",
+        None,
+    ),
+    "upload_size_bytes": ("histogram", "Sizes of stored photos.", SIZE_BUCKETS),
+    "scheduler_jobs_total": (
+        "counter",
+        "Scheduled job runs, by job and outcome.",
+        None,
+    ),
+    "scheduler_job_duration_seconds": (
+        "histogram",
+        "How long scheduled jobs ran.",
+        JOB_BUCKETS,
+    ),
+    "scheduler_job_delay_seconds": (
+        "histogram",
+        "How long after their scheduled time jobs started.",
+        JOB_BUCKETS,
+    ),
+}
+
+
+def _merge(into, samples):
+    for key, value in samples.items():
+        if isinstance(value, list):
+            existing = into.get(key)
+            if existing is None:
+                into[key] = list(value)
+            else:
+                for i, item in enumerate(value):
+                    existing[i] += item
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render(totals):
+    """Format samples as the Prometheus text exposition format."""
+    series = {}
+    for (name, labels), value in totals.items():
+        series.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (kind, help, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series.get(name, [])):
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            # Histograms are stored per bucket; the format wants running totals.
+            count = 0
+            for bound, observed in zip(buckets + (float("inf"),), value):
+                count += observed
+                le = labels + (("le", _number(bound)),)
+                lines.append(f"{name}_bucket{_labels(le)} {_number(count)}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {_number(count)}")
+    return "\n".join(lines) + "\n"
+
+
+class Metrics:
+    """Request, upload and scheduler metrics exported in Prometheus format.
+
+    Each thread records into its own dict, so recording never takes a lock.
+    Every process writes its totals to ``METRICS_DIR`` about once a second and
+    ``/metrics`` adds up the files of all processes, so whichever worker
+    answers a scrape reports on the whole deployment.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker starts counting from zero under its own pid.
+            os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self._flush_pending)
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._dirty = False
+        self._flusher = None
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_DIR", os.path.join(app.instance_path, "metrics"))
+        app.config.setdefault("METRICS_FLUSH_SECONDS", 1)
+        app.config.setdefault("METRICS_TOKEN", None)
+        self.directory = app.config["METRICS_DIR"]
+        self.flush_seconds = app.config["METRICS_FLUSH_SECONDS"]
+        self.token = app.config["METRICS_TOKEN"]
+        self.logger = app.logger
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        got_request_exception.connect(self._request_failed, app)
+        app.add_url_rule("/metrics", "metrics", self.export)
+        app.extensions["metrics"] = self
+
+    def _samples(self):
+        samples = getattr(self._local, "samples", None)
+        if samples is None:
+            samples = self._local.samples = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), samples))
+                if self.directory and self._flusher is None:
+                    self._flusher = threading.Thread(
+                        target=self._flush_loop, name="metrics-flush", daemon=True
+                    )
+                    self._flusher.start()
+        return samples
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        samples = self._samples()
+        samples[key] = samples.get(key, 0) + value
+        self._dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        samples = self._samples()
+        counts = samples.get(key)
+        if counts is None:
+            # One slot per bucket and one for +Inf, then the sum.
+            counts = samples[key] = [0] * (len(buckets) + 2)
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+        self._dirty = True
+
+    def snapshot(self):
+        """This process's totals."""
+        with self._lock:
+            # Threads come and go with some servers; fold finished ones into
+            # one dict so the list of shards stays short.
+            live = []
+            for thread, samples in self._shards:
+                if thread.is_alive():
+                    live.append((thread, samples))
+                else:
+                    _merge(self._retired, samples)
+            self._shards = live
+            totals = {}
+            _merge(totals, self._retired)
+        for _, samples in live:
+            _merge(totals, samples.copy())
+        return totals
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self):
+        """Write this process's totals where other processes can read them."""
+        samples = [
+            [name, labels, value] for (name, labels), value in self.snapshot().items()
+        ]
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(samples, f)
+        os.replace(tmp_path, self._path(os.getpid()))
+
+    def _flush_pending(self):
+        if not (self.directory and self._dirty):
+            return
+        self._dirty = False
+        try:
+            self.flush()
+        except OSError as exc:
+            self.logger.warning("Could not write metrics: %s", exc)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self._flush_pending()
+
+    def collect(self):
+        """Totals across every process that has written to ``METRICS_DIR``.
+
+        Files of exited processes are kept so counters never go backwards;
+        ``flask clear-metrics`` removes them when the whole service restarts.
+        """
+        totals = self.snapshot()
+        if not self.directory:
+            return totals
+        own = os.path.basename(self._path(os.getpid()))
+        with os.scandir(self.directory) as it:
+            paths = [e.path for e in it if e.name.endswith(".json") and e.name != own]
+        for path in paths:
+            try:
+                with open(path) as f:
+                    samples = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            _merge(
+                totals,
+                {
+                    (name, tuple(map(tuple, labels))): value
+                    for name, labels, value in samples
+                },
+            )
+        return totals
+
+    def clear(self):
+        """Remove every process's totals; returns how many processes had some."""
+        if not self.directory:
+            return 0
+        removed = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    os.remove(entry.path)
+                    removed += 1
+                elif entry.name.endswith(".tmp"):
+                    os.remove(entry.path)
+        return removed
+
+    def export(self):
+        if self.token and not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {self.token}"
+        ):
+            abort(401)
+        response = current_app.response_class(
+            render(self.collect()), content_type=CONTENT_TYPE
+        )
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def _request_started(self, sender, **extra):
+        g.metrics_started = time.perf_counter()
+
+    def _request_finished(self, sender, response, **extra):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        # Unrouted requests share one label so stray URLs cannot add series.
+        endpoint = request.endpoint or "unmatched"
+        self.observe(
+            "http_request_duration_seconds",
+            time.perf_counter() - started,
+            endpoint=endpoint,
+            method=request.method,
+        )
+        self.inc(
+            "http_requests_total",
+            endpoint=endpoint,
+            method=request.method,
+            status=str(response.status_code),
+        )
+
+    def _request_failed(self, sender, exception, **extra):
+        self.inc(
+            "http_request_exceptions_total",
+            endpoint=request.endpoint or "unmatched",
+            exception=type(exception).__name__,
+        )
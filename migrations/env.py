@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+import sharding
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -45,6 +47,15 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Tables the models do not describe (the APScheduler job store and the
+    # full-text index with its shadow tables) are managed elsewhere; never
+    # autogenerate drops for them.
+    if type_ == "table" and reflected and compare_to is None:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -94,17 +106,35 @@ def run_migrations_online():
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
-    connectable = get_engine()
-
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=get_metadata(),
-            **conf_args
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+    # Every shard has the main database's schema, so all of them are
+    # migrated together; autogenerate only needs to compare one.
+    engines = [get_engine()]
+    if not getattr(config.cmd_opts, 'autogenerate', False):
+        engines += sharding.shard_engines()
+
+    conf_args.setdefault("include_object", include_object)
+    for connectable in engines:
+        with connectable.connect() as connection:
+            sqlite = connection.dialect.name == "sqlite"
+            if sqlite:
+                # Batch mode drops and recreates tables, which with foreign
+                # keys enforced would cascade into their children.
+                connection.exec_driver_sql("PRAGMA foreign_keys = OFF")
+                connection.commit()
+            # SQLite cannot alter most constraints in place; batch mode
+            # rebuilds the table instead.
+            conf_args.setdefault("render_as_batch", sqlite)
+            context.configure(
+                connection=connection,
+                target_metadata=get_metadata(),
+                **conf_args
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA foreign_keys = ON")
+                connection.commit()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,70 @@
+"""Baseline schema
+
+The tables as the first release created them with db.create_all(). Stamp a
+database from that release with this revision, then upgrade.
+
+Revision ID: c05fa7380379
+Revises:
+Create Date: 2026-10-17 01:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c05fa7380379'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('plant',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('species', sa.String(length=100), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('photo_filename', sa.String(length=200), nullable=True),
+    sa.Column('watering_frequency', sa.Integer(), nullable=False),
+    sa.Column('sunlight_preference', sa.String(length=50), nullable=False),
+    sa.Column('last_watered', sa.DateTime(), nullable=True),
+    sa.Column('date_added', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('care_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plant_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=50), nullable=False),
+    sa.Column('event_date', sa.DateTime(), nullable=False),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['plant_id'], ['plant.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('journal_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plant_id', sa.Integer(), nullable=False),
+    sa.Column('entry_date', sa.DateTime(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('photo_filename', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['plant_id'], ['plant.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('journal_entry')
+    op.drop_table('care_event')
+    op.drop_table('plant')
+    op.drop_table('user')
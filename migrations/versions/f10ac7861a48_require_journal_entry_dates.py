@@ -0,0 +1,45 @@
+"""Require journal entry dates
+
+Entries with no date sort outside the journal's keyset pages, so they get
+their plant's date_added.
+
+Revision ID: f10ac7861a48
+Revises: fdfd51b1e4e5
+Create Date: 2026-10-17 09:12:40.215873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = 'f10ac7861a48'
+down_revision = 'fdfd51b1e4e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        'UPDATE journal_entry SET entry_date = ('
+        'SELECT plant.date_added FROM plant WHERE plant.id = journal_entry.plant_id'
+        ') WHERE entry_date IS NULL'
+    )
+    with op.batch_alter_table('journal_entry', schema=None) as batch_op:
+        batch_op.alter_column(
+            'entry_date', existing_type=sa.DateTime(), nullable=False
+        )
+
+    # Rebuilding the journal_entry table on SQLite dropped its search triggers.
+    search.install(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table('journal_entry', schema=None) as batch_op:
+        batch_op.alter_column(
+            'entry_date', existing_type=sa.DateTime(), nullable=True
+        )
+
+    search.install(op.get_bind())
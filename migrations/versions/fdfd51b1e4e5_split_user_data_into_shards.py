@@ -0,0 +1,65 @@
+"""Split user data into shards
+
+Revision ID: fdfd51b1e4e5
+Revises: d55add40085e
+Create Date: 2026-10-17 02:06:15.768440
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = 'fdfd51b1e4e5'
+down_revision = 'd55add40085e'
+branch_labels = None
+depends_on = None
+
+# Tables whose user_id can no longer reference the user table, which stays in
+# the main database while their rows move to the user's shard.
+SHARDED_TABLES = ['pending_upload', 'plant', 'user_data_version']
+# Lets batch mode find SQLite's unnamed foreign keys by name.
+NAMING_CONVENTION = {
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+}
+
+
+def _user_fk(table):
+    if op.get_bind().dialect.name == 'sqlite':
+        return f'fk_{table}_user_id_user'
+    return f'{table}_user_id_fkey'
+
+
+def upgrade():
+    for table in SHARDED_TABLES:
+        with op.batch_alter_table(
+            table, naming_convention=NAMING_CONVENTION
+        ) as batch_op:
+            batch_op.drop_constraint(_user_fk(table), type_='foreignkey')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('shard', sa.Integer(), nullable=False, server_default='0')
+        )
+        batch_op.create_index(batch_op.f('ix_user_shard'), ['shard'], unique=False)
+
+    # Rebuilding the plant table on SQLite dropped its search triggers.
+    search.install(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_shard'))
+        batch_op.drop_column('shard')
+
+    for table in SHARDED_TABLES:
+        with op.batch_alter_table(
+            table, naming_convention=NAMING_CONVENTION
+        ) as batch_op:
+            batch_op.create_foreign_key(
+                _user_fk(table), 'user', ['user_id'], ['id'], ondelete='CASCADE'
+            )
+
+    search.install(op.get_bind())
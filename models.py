@@ -1,9 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 
-db = SQLAlchemy()
+from sharding import ShardedSession
+
+db = SQLAlchemy(session_options={"class_": ShardedSession})
 
 
 class User(UserMixin, db.Model):
@@ -11,8 +13,17 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    timezone = db.Column(db.String(64))
+    # Index into DATABASE_SHARD_URLS of the database holding this user's data.
+    shard = db.Column(db.Integer, nullable=False, default=0, index=True)
+    # Plants may be in another database, so there is no foreign key and the
+    # relationship is read-only; rebalance.delete_user deletes a user's data.
     plants = db.relationship(
-        "Plant", backref="owner", lazy=True, cascade="all, delete-orphan"
+        "Plant",
+        primaryjoin="User.id == foreign(Plant.user_id)",
+        backref=db.backref("owner", viewonly=True),
+        lazy=True,
+        viewonly=True,
     )
 
     def set_password(self, password):
@@ -22,36 +33,150 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 
+# Longest watering interval in days; also keeps due dates within datetime's range.
+MAX_WATERING_FREQUENCY = 365
+
+
 class Plant(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     species = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(100), nullable=False)
-    photo_filename = db.Column(db.String(200))
+    photo_filename = db.Column(db.String(200), index=True)
     watering_frequency = db.Column(db.Integer, nullable=False)
     sunlight_preference = db.Column(db.String(50), nullable=False)
     last_watered = db.Column(db.DateTime)
+    next_watering_due = db.Column(db.DateTime, index=True)
     date_added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    # The database deletes a plant's rows in one statement per table; the ORM
+    # only handles children that happen to be loaded already.
     care_events = db.relationship(
-        "CareEvent", backref="plant", lazy=True, cascade="all, delete-orphan"
+        "CareEvent",
+        backref="plant",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     journal_entries = db.relationship(
-        "JournalEntry", backref="plant", lazy=True, cascade="all, delete-orphan"
+        "JournalEntry",
+        backref="plant",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    care_stats = db.relationship(
+        "PlantCareStats",
+        uselist=False,
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
+    def update_next_watering_due(self):
+        if self.last_watered is None:
+            self.next_watering_due = None
+        else:
+            self.next_watering_due = self.last_watered + timedelta(
+                days=self.watering_frequency
+            )
+
+    def days_overdue(self, now):
+        if self.next_watering_due is None or self.next_watering_due > now:
+            return 0
+        return (now - self.next_watering_due).days
+
 
 class CareEvent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    plant_id = db.Column(db.Integer, db.ForeignKey("plant.id"), nullable=False)
+    plant_id = db.Column(
+        db.Integer, db.ForeignKey("plant.id", ondelete="CASCADE"), nullable=False
+    )
     event_type = db.Column(db.String(50), nullable=False)
     event_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     notes = db.Column(db.Text)
 
+    __table_args__ = (db.Index("ix_care_event_plant_date", "plant_id", "event_date"),)
+
+
+class PlantCareStats(db.Model):
+    plant_id = db.Column(
+        db.Integer, db.ForeignKey("plant.id", ondelete="CASCADE"), primary_key=True
+    )
+    watering_count = db.Column(db.Integer, nullable=False, default=0)
+    fertilizing_count = db.Column(db.Integer, nullable=False, default=0)
+    pruning_count = db.Column(db.Integer, nullable=False, default=0)
+    repotting_count = db.Column(db.Integer, nullable=False, default=0)
+    first_watered = db.Column(db.DateTime)
+    last_watered = db.Column(db.DateTime)
+
+    @property
+    def average_watering_interval(self):
+        if self.watering_count < 2:
+            return None
+        span = self.last_watered - self.first_watered
+        return span.total_seconds() / 86400 / (self.watering_count - 1)
+
 
 class JournalEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    plant_id = db.Column(db.Integer, db.ForeignKey("plant.id"), nullable=False)
-    entry_date = db.Column(db.DateTime, default=datetime.utcnow)
+    plant_id = db.Column(
+        db.Integer, db.ForeignKey("plant.id", ondelete="CASCADE"), nullable=False
+    )
+    entry_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     content = db.Column(db.Text, nullable=False)
-    photo_filename = db.Column(db.String(200))
+    photo_filename = db.Column(db.String(200), index=True)
+
+    __table_args__ = (
+        db.Index("ix_journal_entry_plant_date", "plant_id", "entry_date"),
+    )
+
+
+class StoredFile(db.Model):
+    filename = db.Column(db.String(200), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Bumped on every store so the sweeper leaves recently reused files alone.
+    stored_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True
+    )
+
+
+class PendingUpload(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    offset = db.Column(db.Integer, nullable=False, default=0)
+    complete = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class UserDataVersion(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchedulerLease(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class OutboxMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index("ix_outbox_message_due", "status", "next_attempt_at"),)
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import smtplib
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import insert, select, update
+
+from models import db, OutboxMessage, User
+
+CHUNK_SIZE = 500
+
+
+def _insert_ignoring_duplicates():
+    dialect = db.session.get_bind(OutboxMessage).dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(OutboxMessage).on_conflict_do_nothing(
+        index_elements=["idempotency_key"]
+    )
+
+
+def enqueue(rows):
+    """Add messages to the outbox, skipping any whose idempotency key exists.
+
+    Does not commit. Returns the number of rows offered.
+    """
+    statement = _insert_ignoring_duplicates()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start : start + CHUNK_SIZE]
+        if statement is None:
+            existing = set(
+                db.session.scalars(
+                    select(OutboxMessage.idempotency_key).where(
+                        OutboxMessage.idempotency_key.in_(
+                            [row["idempotency_key"] for row in chunk]
+                        )
+                    )
+                )
+            )
+            chunk = [row for row in chunk if row["idempotency_key"] not in existing]
+            if chunk:
+                db.session.execute(insert(OutboxMessage), chunk)
+        else:
+            db.session.execute(statement, chunk)
+    return len(rows)
+
+
+def enqueue_watering_digests(due_plants, now):
+    """Queue one digest per user listing all of their plants that need water.
+
+    The idempotency key is per user and day, so running the reminder job twice
+    on the same day queues nothing new.
+    """
+    by_user = defaultdict(list)
+    for plant in due_plants:
+        by_user[plant.user_id].append(plant.name)
+
+    day = now.date().isoformat()
+    return enqueue(
+        [
+            {
+                "user_id": user_id,
+                "idempotency_key": f"watering:{user_id}:{day}",
+                "kind": "watering_digest",
+                "payload": {"date": day, "plants": names},
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            }
+            for user_id, names in by_user.items()
+        ]
+    )
+
+
+def render(message):
+    """Return ``(subject, text)`` for a claimed message."""
+    plants = message["payload"]["plants"]
+    if len(plants) == 1:
+        subject = f"{plants[0]} needs watering"
+    else:
+        subject = f"{len(plants)} plants need watering"
+    lines = [f"Hi {message['username']},", "", "These plants are due for water:"]
+    lines += [f"  - {name}" for name in plants]
+    return subject, "\n".join(lines) + "\n"
+
+
+class ConsoleTransport:
+    async def send(self, message):
+        subject, text = render(message)
+        print(f"Reminder to {message['email']}: {subject}\n{text}")
+
+
+class SMTPTransport:
+    def __init__(
+        self, host, port, sender, username=None, password=None, starttls=False
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    async def send(self, message):
+        await asyncio.to_thread(self._send, message)
+
+    def _send(self, message):
+        subject, text = render(message)
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message["email"]
+        email["Subject"] = subject
+        # A stable Message-ID lets the receiving side drop a resend after a
+        # crash between sending and recording the delivery.
+        email["Message-ID"] = f"<{message['idempotency_key']}@houseplants>"
+        email.set_content(text)
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(email)
+
+
+class WebhookTransport:
+    def __init__(self, url):
+        self.url = url
+
+    async def send(self, message):
+        await asyncio.to_thread(self._send, message)
+
+    def _send(self, message):
+        subject, text = render(message)
+        body = {
+            "kind": message["kind"],
+            "email": message["email"],
+            "subject": subject,
+            "text": text,
+            **message["payload"],
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Idempotency-Key": message["idempotency_key"],
+            },
+        )
+        with urllib.request.urlopen(request, timeout=30):
+            pass
+
+
+def transport_from_config(config):
+    name = config["REMINDER_TRANSPORT"]
+    if name == "console":
+        return ConsoleTransport()
+    if name == "smtp":
+        return SMTPTransport(
+            config["SMTP_HOST"],
+            config["SMTP_PORT"],
+            config["REMINDER_SENDER"],
+            config["SMTP_USERNAME"],
+            config["SMTP_PASSWORD"],
+            config["SMTP_STARTTLS"],
+        )
+    if name == "webhook":
+        return WebhookTransport(config["REMINDER_WEBHOOK_URL"])
+    raise ValueError(f"Unknown REMINDER_TRANSPORT {name!r}")
+
+
+class DeliveryWorker:
+    """Drain the outbox with bounded concurrency, retrying with backoff.
+
+    Messages are claimed by pushing ``next_attempt_at`` past a lease, so
+    several workers can share an outbox and a message abandoned by a crashed
+    worker is picked up again once its lease runs out.
+    """
+
+    def __init__(
+        self,
+        transport,
+        concurrency=10,
+        batch_size=100,
+        max_attempts=6,
+        backoff_seconds=60,
+        lease_seconds=300,
+    ):
+        self.transport = transport
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+
+    def claim(self, now):
+        due = (
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == "pending")
+            .where(OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at)
+            .limit(self.batch_size)
+        )
+        claimed = db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(due))
+            .where(OutboxMessage.status == "pending")
+            .where(OutboxMessage.next_attempt_at <= now)
+            .values(
+                attempts=OutboxMessage.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds),
+            )
+            .returning(
+                OutboxMessage.id,
+                OutboxMessage.user_id,
+                OutboxMessage.idempotency_key,
+                OutboxMessage.kind,
+                OutboxMessage.payload,
+                OutboxMessage.attempts,
+            )
+        ).all()
+        if not claimed:
+            db.session.commit()
+            return []
+
+        users = {
+            user.id: user
+            for user in db.session.execute(
+                select(User.id, User.username, User.email).where(
+                    User.id.in_({row.user_id for row in claimed})
+                )
+            )
+        }
+        db.session.commit()
+        return [
+            dict(
+                row._asdict(),
+                username=users[row.user_id].username,
+                email=users[row.user_id].email,
+            )
+            for row in claimed
+        ]
+
+    async def _send(self, semaphore, message):
+        async with semaphore:
+            try:
+                await self.transport.send(message)
+            except Exception as exc:
+                return exc
+        return None
+
+    def record(self, messages, errors, now):
+        updates = []
+        for message, error in zip(messages, errors):
+            if error is None:
+                updates.append(
+                    {
+                        "id": message["id"],
+                        "status": "sent",
+                        "sent_at": now,
+                        "last_error": None,
+                    }
+                )
+            elif message["attempts"] >= self.max_attempts:
+                updates.append(
+                    {"id": message["id"], "status": "failed", "last_error": repr(error)}
+                )
+            else:
+                delay = self.backoff_seconds * 2 ** (message["attempts"] - 1)
+                updates.append(
+                    {
+                        "id": message["id"],
+                        "next_attempt_at": now + timedelta(seconds=delay),
+                        "last_error": repr(error),
+                    }
+                )
+        db.session.execute(update(OutboxMessage), updates)
+        db.session.commit()
+
+    async def run_once(self):
+        """Deliver every message that is due now; return ``(sent, failed)``."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        sent = failed = 0
+        while messages := self.claim(datetime.utcnow()):
+            errors = await asyncio.gather(
+                *(self._send(semaphore, message) for message in messages)
+            )
+            self.record(messages, errors, datetime.utcnow())
+            failures = sum(error is not None for error in errors)
+            sent += len(messages) - failures
+            failed += failures
+        return sent, failed
+
+    async def run(self, poll_seconds=30):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(poll_seconds)
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+import database
+import dataversion
+
+
+class MemoryBackend:
+    """Per-process LRU of rendered pages."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend:
+    """Rendered pages as files in a directory shared by every worker process.
+
+    A file's modification time is its age. Superseded versions are never read
+    again, so every ``PRUNE_INTERVAL`` writes the oldest files beyond
+    ``maxsize`` are removed along with expired ones.
+    """
+
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, directory, maxsize, ttl):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.stat(path).st_mtime + self.ttl < time.time():
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.ttl
+        for index, (mtime, path) in enumerate(entries):
+            if index >= self.maxsize or mtime < cutoff:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                os.remove(entry.path)
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class PageCache:
+    """Cache of rendered HTML pages keyed by user and data version.
+
+    Every write route bumps the user's data version, so a stored page is
+    never served after the data behind it changes; the TTL only bounds
+    time-dependent output such as overdue counts and newly generated image
+    derivatives.
+    """
+
+    def __init__(self, app=None):
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PAGE_CACHE_BACKEND", "memory")
+        app.config.setdefault("PAGE_CACHE_SIZE", 512)
+        app.config.setdefault("PAGE_CACHE_TTL", 300)
+        app.config.setdefault(
+            "PAGE_CACHE_DIR", os.path.join(app.instance_path, "page_cache")
+        )
+        name = app.config["PAGE_CACHE_BACKEND"]
+        size = app.config["PAGE_CACHE_SIZE"]
+        ttl = app.config["PAGE_CACHE_TTL"]
+        if name == "memory":
+            self.backend = MemoryBackend(size, ttl)
+        elif name == "filesystem":
+            self.backend = FileSystemBackend(app.config["PAGE_CACHE_DIR"], size, ttl)
+        elif name == "none":
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f"Unknown PAGE_CACHE_BACKEND {name!r}")
+        app.extensions["page_cache"] = self
+
+    def _key(self, version):
+        # Pages embed the session's CSRF token, so each browser session gets
+        # its own copy.
+        csrf = session.get(
+            current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"), ""
+        )
+        csrf = hashlib.sha256(csrf.encode()).hexdigest()[:16]
+        return (
+            f"{request.endpoint}:{current_user.id}:v{version}:{csrf}:"
+            f"{request.full_path}"
+        )
+
+    def cached(self, view):
+        """Serve a view's HTML from the cache while the user's data is unchanged."""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are rendered into the page, so those
+            # requests bypass the cache entirely.
+            if "_flashes" in session:
+                return view(*args, **kwargs)
+
+            # Read the version from the same session the view will read its
+            # data from, so a lagging replica is never cached under a newer
+            # version.
+            version = dataversion.current(current_user.id, database.read_session())
+            body = self.backend.get(self._key(version))
+            if body is not None:
+                self.hits += 1
+                response = current_app.response_class(body, mimetype="text/html")
+                response.headers["X-Page-Cache"] = "HIT"
+                return response
+
+            self.misses += 1
+            response = current_app.make_response(view(*args, **kwargs))
+            # A streamed page would have to be buffered to be stored.
+            if (
+                response.status_code == 200
+                and not response.is_streamed
+                and "_flashes" not in session
+            ):
+                self.backend.set(self._key(version), response.get_data())
+            response.headers["X-Page-Cache"] = "MISS"
+            return response
+
+        return wrapper
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from models import db
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    return f"{sort_value}~{row_id}"
+
+
+def decode_cursor(cursor, parse=datetime.fromisoformat):
+    try:
+        sort_value, row_id = cursor.rsplit("~", 1)
+        return parse(sort_value), int(row_id)
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def keyset_page(query, sort_column, id_column, cursor=None, limit=20):
+    """Return one page of ``query`` in descending ``(sort_column, id)`` order.
+
+    ``cursor`` is the value returned for the previous page; the next page
+    starts strictly after it, so every page costs the same index seek however
+    deep into the history it is.
+    """
+    if cursor is not None:
+        query = query.filter(db.tuple_(sort_column, id_column) < decode_cursor(cursor))
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+    return rows, next_cursor
+
+
+def _position(cursor):
+    try:
+        position = int(cursor)
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if position < 0:
+        raise InvalidCursor(cursor)
+    return position
+
+
+def id_page(query, id_column, after=None, limit=20):
+    """Return one page of ``query`` in ascending id order.
+
+    ``after`` is the cursor returned for the previous page, the last id it
+    held, so a page deep into a large collection is still one index seek.
+    """
+    if after is not None:
+        query = query.filter(id_column > _position(after))
+    rows = query.order_by(id_column).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+    return rows, next_cursor
+
+
+def offset_page(query, after=None, limit=20):
+    """Return one page of an already ordered ``query``, skipping ``after`` rows.
+
+    For orderings with no column to seek on, such as search relevance.
+    """
+    offset = 0 if after is None else _position(after)
+    rows = query.offset(offset).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(offset + limit)
+    return rows, next_cursor
@@ -0,0 +1,153 @@
+import heapq
+import threading
+import time
+from collections import Counter, deque
+
+from flask import abort, g, has_request_context, render_template, request
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.wsgi import ClosingIterator
+
+
+class RequestProfile:
+    def __init__(self, method, path, keep_slowest):
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.status = None
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = Counter()
+        self.slowest = []
+        self._keep_slowest = keep_slowest
+        self._seq = 0
+
+    def record(self, statement, duration_ms, plan):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.statements[statement] += 1
+        self._seq += 1
+        item = (duration_ms, self._seq, statement, plan)
+        if len(self.slowest) < self._keep_slowest:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def slowest_queries(self):
+        return [
+            {"ms": ms, "statement": statement, "plan": plan}
+            for ms, _, statement, plan in sorted(self.slowest, reverse=True)
+        ]
+
+    def repeated_statements(self):
+        # The same statement issued many times in one request is usually an
+        # N+1 lazy load.
+        return [(s, n) for s, n in self.statements.most_common() if n > 1]
+
+
+def _explain(cursor, dialect, statement, parameters):
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    # Use a fresh DBAPI cursor so the EXPLAIN itself is not profiled and the
+    # original cursor's result set is left untouched.
+    explain = cursor.connection.cursor()
+    try:
+        explain.execute(prefix + statement, parameters)
+        # SQLite returns (id, parent, notused, detail); Postgres one text column.
+        return [str(row[-1]) for row in explain.fetchall()]
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc}"]
+    finally:
+        explain.close()
+
+
+class SQLProfiler:
+    """Opt-in per-request query counting, timing and plan capture."""
+
+    def __init__(self, app=None):
+        self.history = deque()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SQL_PROFILING_EXPLAIN_MS", 50)
+        app.config.setdefault("SQL_PROFILING_SLOWEST", 5)
+        app.config.setdefault("SQL_PROFILING_HISTORY", 50)
+        app.config.setdefault("SQL_PROFILING_USERS", [])
+        self.app = app
+        self.history = deque(maxlen=app.config["SQL_PROFILING_HISTORY"])
+
+        event.listen(Engine, "before_cursor_execute", self._before_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_execute)
+        event.listen(Engine, "handle_error", self._execute_failed)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule(
+            "/debug/queries", "debug_queries", login_required(self.debug_page)
+        )
+        app.extensions["sql_profiler"] = self
+
+    def _start_request(self):
+        g.sql_profile = RequestProfile(
+            request.method, request.path, self.app.config["SQL_PROFILING_SLOWEST"]
+        )
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("profiling_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        started = conn.info["profiling_start"].pop()
+        if not has_request_context() or "sql_profile" not in g:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        plan = None
+        if (
+            not many
+            and duration_ms >= self.app.config["SQL_PROFILING_EXPLAIN_MS"]
+            and statement.lstrip()[:6].upper() in ("SELECT", "UPDATE", "DELETE")
+        ):
+            plan = _explain(cursor, conn.dialect.name, statement, parameters)
+        g.sql_profile.record(statement, duration_ms, plan)
+
+    def _execute_failed(self, context):
+        starts = (
+            context.connection.info.get("profiling_start")
+            if context.connection
+            else None
+        )
+        if starts:
+            starts.pop()
+
+    def _finish_request(self, response):
+        profile = g.get("sql_profile")
+        if profile is None or request.endpoint in ("static", "debug_queries"):
+            return response
+        profile.status = response.status_code
+        if response.is_streamed:
+            # A streamed body runs its queries after the headers are sent, so
+            # it gets no headers and is recorded once the body is done.
+            response.response = ClosingIterator(
+                response.response, lambda: self._store(profile)
+            )
+            return response
+        del g.sql_profile
+        response.headers["X-Query-Count"] = str(profile.count)
+        response.headers["X-Query-Time-Ms"] = f"{profile.total_ms:.2f}"
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={profile.total_ms:.2f};desc="{profile.count} queries"',
+        )
+        self._store(profile)
+        return response
+
+    def _store(self, profile):
+        with self._lock:
+            self.history.appendleft(profile)
+
+    def debug_page(self):
+        if current_user.username not in self.app.config["SQL_PROFILING_USERS"]:
+            abort(404)
+        with self._lock:
+            profiles = list(self.history)
+        return render_template("debug_queries.html", profiles=profiles)
@@ -0,0 +1,217 @@
+from contextlib import ExitStack
+
+import sqlalchemy as sa
+from flask import current_app
+
+from models import (
+    db,
+    CareEvent,
+    JournalEntry,
+    PendingUpload,
+    Plant,
+    PlantCareStats,
+    User,
+    UserDataVersion,
+)
+from sharding import shard_engine, shards
+
+MOVE_CHUNK_SIZE = 500
+# Copies to make before giving up on a user who keeps writing during them.
+MOVE_ATTEMPTS = 3
+
+
+def assign_shard():
+    """Shard for a new user: the one with the fewest users."""
+    counts = dict(
+        db.session.execute(
+            sa.select(User.shard, sa.func.count()).group_by(User.shard)
+        ).all()
+    )
+    return min(shards(), key=lambda index: (counts.get(index, 0), index))
+
+
+def _bump_version(conn, user_id):
+    table = UserDataVersion.__table__
+    result = conn.execute(
+        sa.update(table)
+        .where(table.c.user_id == user_id)
+        .values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        conn.execute(sa.insert(table).values(user_id=user_id, version=1))
+
+
+def _delete_user_data(conn, user_id):
+    # Care events, journal entries and care stats cascade from the plants.
+    for model in (Plant, PendingUpload, UserDataVersion):
+        table = model.__table__
+        conn.execute(sa.delete(table).where(table.c.user_id == user_id))
+
+
+def _copy_plants(src, dst, user_id, chunk_size):
+    plant = Plant.__table__
+    id_map = {}
+    rows = src.execute(
+        sa.select(plant).where(plant.c.user_id == user_id).order_by(plant.c.id)
+    )
+    for chunk in rows.mappings().partitions(chunk_size):
+        new_ids = dst.scalars(
+            sa.insert(plant).returning(plant.c.id, sort_by_parameter_order=True),
+            [
+                {key: value for key, value in row.items() if key != "id"}
+                for row in chunk
+            ],
+        ).all()
+        id_map.update(zip((row["id"] for row in chunk), new_ids))
+    return id_map
+
+
+def _copy_plant_rows(src, dst, table, user_id, id_map, chunk_size):
+    plant = Plant.__table__
+    owned = sa.select(plant.c.id).where(plant.c.user_id == user_id)
+    rows = src.execute(sa.select(table).where(table.c.plant_id.in_(owned)))
+    renumber = not table.c.plant_id.primary_key
+    for chunk in rows.mappings().partitions(chunk_size):
+        values = []
+        for row in chunk:
+            row = dict(row, plant_id=id_map[row["plant_id"]])
+            if renumber:
+                del row["id"]
+            values.append(row)
+        dst.execute(sa.insert(table), values)
+
+
+def _copy_user_rows(src, dst, table, user_id):
+    rows = src.execute(sa.select(table).where(table.c.user_id == user_id))
+    values = [dict(row) for row in rows.mappings()]
+    if values:
+        dst.execute(sa.insert(table), values)
+
+
+def _version(conn, user_id):
+    table = UserDataVersion.__table__
+    return conn.scalar(sa.select(table.c.version).where(table.c.user_id == user_id))
+
+
+def move_user(user_id, target, chunk_size=MOVE_CHUNK_SIZE):
+    """Move a user's data to shard ``target``; returns the number of plants.
+
+    Plants, care events and journal entries get new ids in the target shard.
+    The user's rows are copied without holding the source's write lock, so
+    other users of the shard, and this one, can write meanwhile. The copy
+    then bumps the user's data version again and compares it: a write that
+    landed during the copy changed it and the copy is redone. Otherwise the
+    directory is pointed at the target while that bump still holds the lock.
+    Every write bumps the version too and then checks the directory, so a
+    write that waited for the move is refused (``dataversion.bump``) instead
+    of landing in the old shard. The source rows are deleted only after the
+    directory points at the target, and a move that was interrupted can
+    simply be run again.
+    """
+    source = db.session.scalar(sa.select(User.shard).where(User.id == user_id))
+    db.session.close()
+    if source == target:
+        return 0
+
+    with ExitStack() as stack:
+        src = stack.enter_context(shard_engine(source).connect())
+        dst = stack.enter_context(shard_engine(target).connect())
+        # A shard that is the main database also updates the directory, so
+        # no second connection ever waits on its write lock.
+        directory = {src.engine: src, dst.engine: dst}.get(db.engine)
+        if directory is None:
+            directory = stack.enter_context(db.engine.connect())
+
+        for _ in range(MOVE_ATTEMPTS):
+            _bump_version(src, user_id)
+            copied = _version(src, user_id)
+            src.commit()
+
+            _delete_user_data(dst, user_id)
+            id_map = _copy_plants(src, dst, user_id, chunk_size)
+            for model in (CareEvent, JournalEntry, PlantCareStats):
+                _copy_plant_rows(src, dst, model.__table__, user_id, id_map, chunk_size)
+            for model in (PendingUpload, UserDataVersion):
+                _copy_user_rows(src, dst, model.__table__, user_id)
+            # Pages cached before the move must not match the new ids.
+            _bump_version(dst, user_id)
+            src.rollback()
+
+            _bump_version(src, user_id)
+            if _version(src, user_id) == copied + 1:
+                break
+            src.rollback()
+            dst.rollback()
+        else:
+            raise RuntimeError(
+                f"User {user_id} kept writing during {MOVE_ATTEMPTS} attempts "
+                "to move them; try again later."
+            )
+
+        directory.execute(
+            sa.update(User.__table__)
+            .where(User.__table__.c.id == user_id)
+            .values(shard=target)
+        )
+        dst.commit()
+        directory.commit()
+        _delete_user_data(src, user_id)
+        src.commit()
+
+    # The change bypassed the ORM, so tell other workers' user caches.
+    current_app.extensions["user_cache"].bump_version()
+    return len(id_map)
+
+
+def delete_user(user_id):
+    """Delete a user and all their data; returns the number of plants.
+
+    A user's data has no foreign key to ``user``, so it is deleted here with
+    one statement per table in the user's shard, and the database cascades
+    from the plants. The user row goes only after their data is gone, so a
+    delete that was interrupted can simply be run again.
+    """
+    shard = db.session.scalar(sa.select(User.shard).where(User.id == user_id))
+    db.session.close()
+    if shard is None:
+        return 0
+
+    with ExitStack() as stack:
+        conn = stack.enter_context(shard_engine(shard).connect())
+        directory = conn if conn.engine is db.engine else None
+        if directory is None:
+            directory = stack.enter_context(db.engine.connect())
+
+        plant = Plant.__table__
+        count = conn.scalar(
+            sa.select(sa.func.count()).where(plant.c.user_id == user_id)
+        )
+        _delete_user_data(conn, user_id)
+        conn.commit()
+        directory.execute(
+            sa.delete(User.__table__).where(User.__table__.c.id == user_id)
+        )
+        directory.commit()
+
+    current_app.extensions["user_cache"].bump_version()
+    return count
+
+
+def plan_rebalance():
+    """Moves, as ``(user_id, shard)`` pairs, that even out users per shard."""
+    users = {index: [] for index in shards()}
+    for user_id, shard in db.session.execute(
+        sa.select(User.id, User.shard).order_by(User.id)
+    ):
+        users[shard].append(user_id)
+
+    moves = []
+    while True:
+        fullest = max(users, key=lambda index: (len(users[index]), -index))
+        target = min(users, key=lambda index: (len(users[index]), index))
+        if len(users[fullest]) - len(users[target]) <= 1:
+            return moves
+        # The newest users have the least history to copy.
+        user_id = users[fullest].pop()
+        users[target].append(user_id)
+        moves.append((user_id, target))
@@ -0,0 +1,227 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+)
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.util import ref_to_obj
+from sqlalchemy.exc import IntegrityError
+
+from models import db, SchedulerLease
+
+LEASE_NAME = "scheduler"
+LEASE_SECONDS = 60
+RENEW_SECONDS = 20
+# A daily reminder run that was missed while no scheduler was up still runs
+# once on start-up if it is less than this late.
+MISFIRE_GRACE_SECONDS = 12 * 60 * 60
+
+
+def acquire_lease(holder, now=None, name=LEASE_NAME, seconds=LEASE_SECONDS):
+    """Take or renew the named lease; True if ``holder`` now owns it."""
+    now = now or datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    result = db.session.execute(
+        db.update(SchedulerLease)
+        .where(
+            SchedulerLease.name == name,
+            db.or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now),
+        )
+        .values(holder=holder, expires_at=expires_at)
+    )
+    if result.rowcount == 0:
+        db.session.add(SchedulerLease(name=name, holder=holder, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return True
+    db.session.commit()
+    return True
+
+
+def release_lease(holder, name=LEASE_NAME):
+    db.session.execute(
+        db.delete(SchedulerLease).where(
+            SchedulerLease.name == name, SchedulerLease.holder == holder
+        )
+    )
+    db.session.commit()
+
+
+class JobReporter:
+    """Log and record how long each job ran and how late it started."""
+
+    def __init__(self, logger, metrics):
+        self.logger = logger
+        self.metrics = metrics
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            with self._lock:
+                for run_time in event.scheduled_run_times:
+                    self._started[(event.job_id, run_time)] = datetime.now(
+                        run_time.tzinfo
+                    )
+            return
+        if event.code == EVENT_JOB_MISSED:
+            self.logger.warning(
+                "Job %s missed its run at %s", event.job_id, event.scheduled_run_time
+            )
+            self.metrics.inc("scheduler_jobs_total", job=event.job_id, outcome="missed")
+            return
+
+        scheduled = event.scheduled_run_time
+        with self._lock:
+            started = self._started.pop((event.job_id, scheduled), None)
+        finished = datetime.now(scheduled.tzinfo)
+        started = started or finished
+        duration = (finished - started).total_seconds()
+        late = (started - scheduled).total_seconds()
+        outcome = "error" if event.code == EVENT_JOB_ERROR else "success"
+        self.metrics.inc("scheduler_jobs_total", job=event.job_id, outcome=outcome)
+        self.metrics.observe(
+            "scheduler_job_duration_seconds", duration, job=event.job_id
+        )
+        self.metrics.observe(
+            "scheduler_job_delay_seconds", max(late, 0), job=event.job_id
+        )
+        if event.code == EVENT_JOB_ERROR:
+            self.logger.error(
+                "Job %s failed after %.2fs: %r", event.job_id, duration, event.exception
+            )
+        elif late > RENEW_SECONDS:
+            self.logger.info(
+                "Job %s caught up the run scheduled for %s (%.0fs late) in %.2fs",
+                event.job_id,
+                scheduled.isoformat(timespec="seconds"),
+                late,
+                duration,
+            )
+        else:
+            self.logger.info("Job %s ran in %.2fs", event.job_id, duration)
+
+
+def create_scheduler(app):
+    scheduler = BackgroundScheduler(
+        jobstores={"default": SQLAlchemyJobStore(engine=db.engine)},
+        job_defaults={"coalesce": True, "max_instances": 1},
+    )
+    scheduler.add_listener(
+        JobReporter(app.logger, app.extensions["metrics"]),
+        EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED,
+    )
+    return scheduler
+
+
+# Job id -> (function reference, interval).
+JOBS = {
+    "watering-reminders": ("tasks:check_watering_reminders", {"hours": 24}),
+    "sweep-uploads": ("tasks:sweep_uploads", {"hours": 1}),
+}
+
+# The app whose context jobs run in, registered by ``run``. Jobs are stored as
+# "scheduler:run_job", so this is always the imported ``scheduler`` module's
+# registry, never one belonging to a script run as ``__main__``.
+_registry = {}
+
+
+def register_app(app):
+    current = _registry.setdefault("app", app)
+    if current is not app:
+        raise RuntimeError("A scheduler is already running for another app.")
+
+
+def unregister_app(app):
+    if _registry.get("app") is app:
+        del _registry["app"]
+
+
+def run_job(ref):
+    """Job entry point: call the task at ``ref`` inside the app context."""
+    app = _registry.get("app")
+    if app is None:
+        raise RuntimeError("No app registered; start jobs with scheduler.run().")
+    with app.app_context():
+        return ref_to_obj(ref)()
+
+
+def add_jobs(scheduler):
+    # An existing job keeps its stored next run time, which is what lets a
+    # run missed while no scheduler was up be caught up. Jobs are stored by
+    # textual reference so the job store never pickles a function object.
+    for job_id, (ref, interval) in JOBS.items():
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(
+                "scheduler:run_job",
+                trigger="interval",
+                args=(ref,),
+                id=job_id,
+                misfire_grace_time=MISFIRE_GRACE_SECONDS,
+                **interval,
+            )
+        elif tuple(job.args) != (ref,):
+            # Stored before tasks moved out of app.py; modifying keeps the
+            # next run time.
+            scheduler.modify_job(job_id, func="scheduler:run_job", args=(ref,))
+
+
+def run(app, holder=None):
+    """Run scheduled jobs while holding the leader lease; block until stopped.
+
+    Any number of scheduler processes may be started. Only the one holding the
+    lease runs jobs, and a standby takes over within ``LEASE_SECONDS`` of the
+    leader going away.
+    """
+    holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+    app.logger.setLevel(logging.INFO)
+    register_app(app)
+    scheduler = None
+    try:
+        while True:
+            with app.app_context():
+                leader = acquire_lease(holder)
+                if leader and scheduler is None:
+                    app.logger.info("%s acquired the scheduler lease", holder)
+                    scheduler = create_scheduler(app)
+                    # Start paused so the stored job can be looked up before
+                    # anything, including an overdue run, is executed.
+                    scheduler.start(paused=True)
+                    add_jobs(scheduler)
+                    scheduler.resume()
+                elif not leader and scheduler is not None:
+                    app.logger.warning("%s lost the scheduler lease", holder)
+                    scheduler.shutdown()
+                    scheduler = None
+            time.sleep(RENEW_SECONDS)
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown()
+            with app.app_context():
+                release_lease(holder)
+        unregister_app(app)
+
+
+if __name__ == "__main__":
+    # Run through the importable module, whose registry the stored jobs use.
+    import scheduler
+    from app import create_app
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        scheduler.run(create_app())
+    except KeyboardInterrupt:
+        pass
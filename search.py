@@ -0,0 +1,256 @@
+import logging
+import re
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+import sharding
+from models import db, Plant, JournalEntry
+
+# The FTS tables are created by install() from the migrations rather than from
+# the models, so they live on their own metadata.
+_fts_metadata = sa.MetaData()
+plant_fts = sa.Table(
+    "plant_fts",
+    _fts_metadata,
+    sa.Column("rowid", sa.Integer),
+    sa.Column("name", sa.Text),
+    sa.Column("species", sa.Text),
+    sa.Column("location", sa.Text),
+)
+journal_fts = sa.Table(
+    "journal_fts",
+    _fts_metadata,
+    sa.Column("rowid", sa.Integer),
+    sa.Column("content", sa.Text),
+)
+
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS plant_fts USING fts5(
+        name, species, location,
+        content='plant', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS plant_fts_ai AFTER INSERT ON plant BEGIN
+        INSERT INTO plant_fts(rowid, name, species, location)
+        VALUES (new.id, new.name, new.species, new.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS plant_fts_ad AFTER DELETE ON plant BEGIN
+        INSERT INTO plant_fts(plant_fts, rowid, name, species, location)
+        VALUES ('delete', old.id, old.name, old.species, old.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS plant_fts_au
+    AFTER UPDATE OF name, species, location ON plant BEGIN
+        INSERT INTO plant_fts(plant_fts, rowid, name, species, location)
+        VALUES ('delete', old.id, old.name, old.species, old.location);
+        INSERT INTO plant_fts(rowid, name, species, location)
+        VALUES (new.id, new.name, new.species, new.location);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5(
+        content,
+        content='journal_entry', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS journal_fts_ai AFTER INSERT ON journal_entry BEGIN
+        INSERT INTO journal_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS journal_fts_ad AFTER DELETE ON journal_entry BEGIN
+        INSERT INTO journal_fts(journal_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS journal_fts_au
+    AFTER UPDATE OF content ON journal_entry BEGIN
+        INSERT INTO journal_fts(journal_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO journal_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+POSTGRES_SCHEMA = [
+    """CREATE INDEX IF NOT EXISTS ix_plant_search ON plant USING gin (
+        to_tsvector('simple', name || ' ' || species || ' ' || location)
+    )""",
+    """CREATE INDEX IF NOT EXISTS ix_journal_entry_search ON journal_entry
+    USING gin (to_tsvector('simple', content))""",
+]
+
+# Relative bm25 weights of the plant_fts columns: name, species, location.
+PLANT_WEIGHTS = (10.0, 5.0, 2.0)
+
+
+def install(conn):
+    """Create the full-text index on the connection's database.
+
+    Run by the schema migrations. Does nothing on databases without a
+    full-text engine, where search falls back to ``LIKE``.
+    """
+    if conn.dialect.name == "sqlite":
+        try:
+            with conn.begin_nested():
+                existed = conn.execute(
+                    sa.text("SELECT 1 FROM sqlite_master WHERE name = 'plant_fts'")
+                ).first()
+                for statement in SQLITE_SCHEMA:
+                    conn.execute(sa.text(statement))
+                if not existed:
+                    _rebuild_sqlite(conn)
+        except OperationalError:
+            logging.getLogger(__name__).warning(
+                "SQLite FTS5 unavailable; search falls back to LIKE"
+            )
+    elif conn.dialect.name == "postgresql":
+        for statement in POSTGRES_SCHEMA:
+            conn.execute(sa.text(statement))
+
+
+def _detect(engine):
+    if engine.dialect.name == "postgresql":
+        return "postgres"
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            installed = conn.execute(
+                sa.text("SELECT 1 FROM sqlite_master WHERE name = 'plant_fts'")
+            ).first()
+        if installed:
+            return "fts5"
+    return "like"
+
+
+def init_app(app):
+    # None means "detect on first search", so start-up never opens a
+    # connection.
+    app.config.setdefault("SEARCH_BACKEND", None)
+
+
+def current_backend():
+    """``"fts5"``, ``"postgres"`` or ``"like"``, detected once per app."""
+    config = current_app.config
+    if config["SEARCH_BACKEND"] is None:
+        config["SEARCH_BACKEND"] = _detect(db.engine)
+    return config["SEARCH_BACKEND"]
+
+
+def _rebuild_sqlite(conn):
+    conn.execute(sa.text("INSERT INTO plant_fts(plant_fts) VALUES ('rebuild')"))
+    conn.execute(sa.text("INSERT INTO journal_fts(journal_fts) VALUES ('rebuild')"))
+
+
+def rebuild():
+    if current_backend() == "fts5":
+        for index in sharding.shards():
+            with sharding.shard_engine(index).begin() as conn:
+                _rebuild_sqlite(conn)
+
+
+def _terms(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _fts5_match(text):
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # make each one a prefix query.
+    return " AND ".join(f'"{term}"*' for term in _terms(text))
+
+
+def _tsquery(text):
+    return " & ".join(f"{term}:*" for term in _terms(text))
+
+
+def is_ranked(q, backend):
+    """Whether ``apply_search`` orders results by relevance to ``q``."""
+    return backend in ("fts5", "postgres") and bool(_terms(q))
+
+
+def apply_search(query, user_id, q="", species="", location="", backend="like"):
+    """Narrow a query of ``user_id``'s plants to the search terms, best first.
+
+    ``q`` matches plant name, species, location and journal content; the
+    ``species`` and ``location`` filters match any part of their own field.
+    """
+    if species:
+        query = query.filter(Plant.species.ilike(f"%{species}%"))
+    if location:
+        query = query.filter(Plant.location.ilike(f"%{location}%"))
+
+    if backend == "fts5":
+        return _apply_fts5(query, user_id, q)
+    if backend == "postgres":
+        return _apply_postgres(query, q)
+
+    if q:
+        pattern = f"%{q}%"
+        query = query.filter(
+            sa.or_(
+                Plant.name.ilike(pattern),
+                Plant.species.ilike(pattern),
+                Plant.location.ilike(pattern),
+                Plant.journal_entries.any(JournalEntry.content.ilike(pattern)),
+            )
+        )
+    return query
+
+
+def _apply_fts5(query, user_id, q):
+    expression = _fts5_match(q)
+    if not expression:
+        return query
+
+    # The index covers every user's rows, so keep only this user's hits
+    # before they are grouped and ranked.
+    plant_hits = (
+        sa.select(
+            plant_fts.c.rowid.label("plant_id"),
+            sa.func.bm25(sa.literal_column("plant_fts"), *PLANT_WEIGHTS).label("score"),
+        )
+        .join(Plant, Plant.id == plant_fts.c.rowid)
+        .where(
+            sa.literal_column("plant_fts").op("MATCH")(expression),
+            Plant.user_id == user_id,
+        )
+    )
+    journal_hits = (
+        sa.select(
+            JournalEntry.plant_id,
+            sa.func.bm25(sa.literal_column("journal_fts")).label("score"),
+        )
+        .select_from(journal_fts)
+        .join(JournalEntry, JournalEntry.id == journal_fts.c.rowid)
+        .join(Plant, Plant.id == JournalEntry.plant_id)
+        .where(
+            sa.literal_column("journal_fts").op("MATCH")(expression),
+            Plant.user_id == user_id,
+        )
+    )
+    hits = sa.union_all(plant_hits, journal_hits).subquery()
+    ranked = (
+        sa.select(hits.c.plant_id, sa.func.min(hits.c.score).label("score"))
+        .group_by(hits.c.plant_id)
+        .subquery()
+    )
+    # bm25() is lower for better matches.
+    return query.join(ranked, ranked.c.plant_id == Plant.id).order_by(
+        ranked.c.score, Plant.id
+    )
+
+
+def _plant_vector():
+    space = sa.literal_column("' '")
+    return sa.func.to_tsvector(
+        "simple", Plant.name + space + Plant.species + space + Plant.location
+    )
+
+
+def _apply_postgres(query, q):
+    if not _terms(q):
+        return query
+
+    tsquery = sa.func.to_tsquery("simple", _tsquery(q))
+    journal_match = sa.func.to_tsvector("simple", JournalEntry.content).op("@@")(
+        tsquery
+    )
+    query = query.filter(
+        sa.or_(
+            _plant_vector().op("@@")(tsquery),
+            Plant.journal_entries.any(journal_match),
+        )
+    )
+    return query.order_by(sa.func.ts_rank(_plant_vector(), tsquery).desc(), Plant.id)
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+
+# Tables that stay in the main ("directory") database when user data is split
+# across shards. Every other table lives in the shard of the user it belongs to.
+DIRECTORY_TABLES = frozenset(
+    {"user", "stored_file", "scheduler_lease", "outbox_message"}
+)
+
+
+def _binds():
+    # One bind key per shard; None for a shard that is the main database.
+    return current_app.config["SHARD_BINDS"]
+
+
+def enabled():
+    """Whether user data is split across shards."""
+    return bool(_binds())
+
+
+def shards():
+    """Index of every shard; just ``0`` when data is not sharded."""
+    return range(max(len(_binds()), 1))
+
+
+def shard_engine(index):
+    db = current_app.extensions["sqlalchemy"]
+    if not _binds():
+        return db.engine
+    return db.engines[_binds()[index]]
+
+
+def shard_engines():
+    """Engines of the shards other than the main database."""
+    engines = current_app.extensions["sqlalchemy"].engines
+    return [engines[key] for key in _binds() if key is not None]
+
+
+def current_shard():
+    """The shard user data goes to: set by ``use_shard``, else the user's."""
+    if "shard" not in g:
+        if not (has_request_context() and current_user.is_authenticated):
+            raise RuntimeError("No shard selected; wrap the work in use_shard().")
+        g.shard = current_user.shard
+    return g.shard
+
+
+@contextmanager
+def use_shard(index):
+    """Send user data to shard ``index`` until the block exits.
+
+    Rows in different shards can share primary keys, so the session is closed
+    on the way in and out to keep them out of one identity map. Commit first.
+    """
+    session = current_app.extensions["sqlalchemy"].session
+    previous = g.pop("shard", None)
+    session.close()
+    g.shard = index
+    try:
+        yield
+    finally:
+        session.close()
+        g.pop("shard", None)
+        if previous is not None:
+            g.shard = previous
+
+
+def _table(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table
+    if isinstance(clause, sa.Table):
+        return clause
+    if isinstance(clause, sa.sql.expression.UpdateBase):
+        return clause.table
+    if clause is not None:
+        tables = find_tables(clause, include_crud=True)
+        return tables[0] if tables else None
+    return None
+
+
+class ShardedSession(Session):
+    """Session that sends user data to the current shard.
+
+    Directory tables always use the main database. Everything else, textual
+    SQL included, goes to ``current_shard()``. Without shards configured this
+    is a plain Flask-SQLAlchemy session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _binds():
+            table = _table(mapper, clause)
+            if table is None or table.name not in DIRECTORY_TABLES:
+                return self._db.engines[_binds()[current_shard()]]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
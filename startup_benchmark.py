@@ -0,0 +1,239 @@
+"""Measure how long a new worker process takes to start serving.
+
+    python startup_benchmark.py --runs 10 --output startup.json
+    python startup_benchmark.py --imports 15 --compare startup.json
+    python startup_benchmark.py --budget-ms process_ms=900 --compare startup.json --tolerance 10
+
+Each run starts a fresh interpreter, so nothing is cached in memory. The child
+times importing ``app``, building the app with ``create_app`` and serving its
+first request. The parent times the whole process. ``--imports`` also lists
+the slowest modules reported by ``python -X importtime``. The script exits with
+status 1 if a median is over its ``--budget-ms`` or, with ``--compare``, more
+than ``--tolerance`` percent slower than the baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmark import git_commit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+METRICS = ["import_ms", "create_app_ms", "first_request_ms", "process_ms"]
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get(sys.argv[1]).status_code
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "status": status,
+}))
+"""
+
+
+def budget(text):
+    metric, _, ms = text.partition("=")
+    if metric not in METRICS:
+        raise argparse.ArgumentTypeError(
+            f"{metric!r} is not one of {', '.join(METRICS)}"
+        )
+    try:
+        return metric, float(ms)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{ms!r} is not a number of milliseconds")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/login", help="URL of the first request")
+    parser.add_argument(
+        "--imports", type=int, default=0, help="list this many slowest imports"
+    )
+    parser.add_argument("--database-url")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--budget-ms",
+        type=budget,
+        action="append",
+        default=[],
+        metavar="METRIC=MS",
+        help="fail if METRIC's median is over MS; may be repeated",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        metavar="PERCENT",
+        help="fail if a median is this much slower than in --compare",
+    )
+    args = parser.parse_args(argv)
+    if args.tolerance is not None and not args.compare:
+        parser.error("--tolerance needs --compare")
+    return args
+
+
+def migrate(env):
+    subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "app", "db", "upgrade"],
+        env=env,
+        cwd=HERE,
+        check=True,
+        capture_output=True,
+    )
+
+
+def run_once(env, path):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD, path],
+        env=env,
+        cwd=HERE,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    sample = json.loads(completed.stdout.splitlines()[-1])
+    sample["process_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def slowest_imports(env, count):
+    """The ``count`` modules with the largest cumulative import time."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        env=env,
+        cwd=HERE,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Only ``app`` and what it imports directly; deeper imports are
+        # already counted in those.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            modules.append((int(cumulative) / 1000, name.strip()))
+    modules.sort(reverse=True)
+    return [
+        {"module": name, "cumulative_ms": round(ms, 1)} for ms, name in modules[:count]
+    ]
+
+
+def summarize(samples):
+    summary = {}
+    for metric in METRICS:
+        values = sorted(sample[metric] for sample in samples)
+        summary[metric] = {
+            "median": round(statistics.median(values), 1),
+            "min": round(values[0], 1),
+            "max": round(values[-1], 1),
+        }
+    return summary
+
+
+def print_report(results, baseline=None):
+    base = (baseline or {}).get("startup", {})
+    print(f"{'metric':<18}{'median':>9}{'min':>9}{'max':>9}")
+    for metric, row in results["startup"].items():
+        line = f"{metric:<18}{row['median']:>9}{row['min']:>9}{row['max']:>9}"
+        if metric in base and base[metric]["median"]:
+            change = (row["median"] - base[metric]["median"]) / base[metric]["median"]
+            line += f"  {change * 100:+.0f}% vs {baseline.get('commit')}"
+        print(line)
+    if results["imports"]:
+        print("\nslowest imports (cumulative ms):")
+        for row in results["imports"]:
+            print(f"  {row['cumulative_ms']:>8}  {row['module']}")
+
+
+def regressions(results, budgets, baseline=None, tolerance=None):
+    """Messages for every median over its budget or the baseline's tolerance."""
+    startup = results["startup"]
+    failures = [
+        f"{metric} median {startup[metric]['median']} ms is over its "
+        f"{limit:g} ms budget"
+        for metric, limit in budgets
+        if startup[metric]["median"] > limit
+    ]
+    if tolerance is not None:
+        for metric, row in baseline.get("startup", {}).items():
+            if metric not in startup or not row["median"]:
+                continue
+            change = (startup[metric]["median"] - row["median"]) / row["median"]
+            if change * 100 > tolerance:
+                failures.append(
+                    f"{metric} median is {change * 100:.0f}% slower than "
+                    f"{baseline.get('commit')} (tolerance {tolerance:g}%)"
+                )
+    return failures
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = dict(os.environ)
+    env["DATABASE_URL"] = args.database_url or (
+        "sqlite:///"
+        + os.path.join(tempfile.mkdtemp(prefix="houseplants-startup-"), "startup.db")
+    )
+    # Keep the children's request out of the real service's metrics.
+    env["METRICS_DIR"] = tempfile.mkdtemp(prefix="houseplants-startup-metrics-")
+    migrate(env)
+    # One untimed run warms the bytecode and OS file caches, like any worker
+    # started after the first.
+    run_once(env, args.path)
+
+    samples = [run_once(env, args.path) for _ in range(args.runs)]
+    errors = [sample["status"] for sample in samples if sample["status"] >= 400]
+    if errors:
+        print(f"First request returned {errors[0]}", file=sys.stderr)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "parameters": {"runs": args.runs, "path": args.path},
+        "startup": summarize(samples),
+        "imports": slowest_imports(env, args.imports) if args.imports else [],
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+    failures = regressions(results, args.budget_ms, baseline, args.tolerance)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
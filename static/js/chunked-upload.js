@@ -0,0 +1,104 @@
+// Sends a form's photo to /api/v1/uploads in resumable chunks before the form
+// itself is submitted, then submits the form with only the upload id. Falls
+// back to a normal multipart upload where Web Crypto is unavailable.
+(() => {
+    const API = "/api/v1/uploads";
+    const RETRIES = 5;
+
+    const hex = (buffer) =>
+        Array.from(new Uint8Array(buffer), (b) => b.toString(16).padStart(2, "0")).join("");
+
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+    async function request(url, options, csrfToken) {
+        options.headers = Object.assign({ "X-CSRFToken": csrfToken }, options.headers);
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(url, options);
+                // Retry only server-side hiccups; other errors are final.
+                if (response.status < 500 || attempt >= RETRIES) return response;
+            } catch (error) {
+                if (attempt >= RETRIES) throw error;
+            }
+            await sleep(500 * 2 ** attempt);
+        }
+    }
+
+    async function upload(file, csrfToken, progress) {
+        const sha256 = hex(await crypto.subtle.digest("SHA-256", await file.arrayBuffer()));
+        const key = `chunked-upload:${sha256}:${file.size}`;
+
+        let state = null;
+        const saved = localStorage.getItem(key);
+        if (saved) {
+            const response = await request(`${API}/${saved}`, { method: "GET" }, csrfToken);
+            if (response.ok) state = await response.json();
+        }
+        if (!state) {
+            const response = await request(API, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ filename: file.name, size: file.size, sha256 }),
+            }, csrfToken);
+            if (!response.ok) throw new Error((await response.json()).message);
+            state = await response.json();
+            localStorage.setItem(key, state.id);
+        }
+
+        while (!state.complete) {
+            progress(state.offset / state.size);
+            const chunk = file.slice(state.offset, state.offset + state.chunk_size);
+            const response = await request(`${API}/${state.id}`, {
+                method: "PATCH",
+                headers: {
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": String(state.offset),
+                },
+                body: chunk,
+            }, csrfToken);
+            if (response.status === 409) {
+                // Out of step with the server: ask where to carry on from.
+                state = await (await request(`${API}/${state.id}`, { method: "GET" }, csrfToken)).json();
+                continue;
+            }
+            if (!response.ok) {
+                localStorage.removeItem(key);
+                throw new Error((await response.json()).message);
+            }
+            state = await response.json();
+        }
+        localStorage.removeItem(key);
+        progress(1);
+        return state.id;
+    }
+
+    document.addEventListener("submit", async (event) => {
+        const form = event.target;
+        const uploadId = form.querySelector("input[name='upload_id']");
+        const input = form.querySelector("input[type='file']");
+        if (!uploadId || !input || !input.files.length || !window.crypto?.subtle) return;
+
+        event.preventDefault();
+        const submit = form.querySelector("[type='submit']");
+        let status = form.querySelector("[data-upload-status]");
+        if (!status) {
+            status = document.createElement("div");
+            status.dataset.uploadStatus = "";
+            input.after(status);
+        }
+        status.className = "form-text";
+        if (submit) submit.disabled = true;
+        try {
+            uploadId.value = await upload(input.files[0], form.querySelector("input[name='csrf_token']")?.value, (done) => {
+                status.textContent = `Uploading photo… ${Math.round(done * 100)}%`;
+            });
+            input.value = "";
+            // The Submit button is named "submit" and shadows form.submit().
+            HTMLFormElement.prototype.submit.call(form);
+        } catch (error) {
+            status.textContent = `Upload failed: ${error.message}. Submit again to resume.`;
+            status.classList.add("text-danger");
+            if (submit) submit.disabled = false;
+        }
+    });
+})();
@@ -0,0 +1,58 @@
+# Scheduled jobs. Each runs inside an app context, which the scheduler (or the
+# caller, from the CLI or a benchmark) provides.
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+import outbox
+import sharding
+from models import db, Plant
+from uploads import sweep_orphans
+
+REMINDER_BATCH_SIZE = 500
+
+
+def iter_due_plants(now, batch_size=REMINDER_BATCH_SIZE):
+    # Walk the next_watering_due index in keyset order so only due rows are
+    # read and no more than one batch is held in memory at a time.
+    cursor = None
+    while True:
+        query = db.session.query(
+            Plant.id, Plant.name, Plant.user_id, Plant.next_watering_due
+        ).filter(Plant.next_watering_due <= now)
+        if cursor is not None:
+            query = query.filter(db.tuple_(Plant.next_watering_due, Plant.id) > cursor)
+        batch = (
+            query.order_by(Plant.next_watering_due, Plant.id).limit(batch_size).all()
+        )
+        if not batch:
+            return
+        yield from batch
+        cursor = (batch[-1].next_watering_due, batch[-1].id)
+
+
+def check_watering_reminders():
+    # Only queue digests here; the delivery worker sends them. A user's plants
+    # are all in one shard, so each shard's digests are complete.
+    now = datetime.utcnow()
+    queued = 0
+    for index in sharding.shards():
+        with sharding.use_shard(index):
+            queued += outbox.enqueue_watering_digests(iter_due_plants(now), now)
+            db.session.commit()
+    current_app.logger.info("Queued %d watering digests", queued)
+    return queued
+
+
+def sweep_uploads():
+    before = datetime.utcnow() - timedelta(
+        minutes=current_app.config["UPLOAD_SWEEP_GRACE_MINUTES"]
+    )
+    removed = sweep_orphans(
+        current_app.config["UPLOAD_FOLDER"],
+        before,
+        batch_size=current_app.config["UPLOAD_SWEEP_BATCH_SIZE"],
+    )
+    current_app.logger.info("Removed %d unreferenced uploads", removed)
+    return removed
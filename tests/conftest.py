@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from flask_migrate import upgrade
+
+from app import create_app
+from extensions import bind_migrate
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+PASSWORD = "pw123456"
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on fresh SQLite databases, migrated to the latest schema."""
+
+    def make(shards=0, **config):
+        url = f"sqlite:///{tmp_path / 'main.db'}"
+        shard_urls = [url] + [
+            f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(1, shards)
+        ]
+        app = create_app(
+            {
+                "TESTING": True,
+                "WTF_CSRF_ENABLED": False,
+                "SQLALCHEMY_DATABASE_URI": url,
+                "DATABASE_SHARD_URLS": shard_urls if shards else [],
+                "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+                "METRICS_DIR": str(tmp_path / "metrics"),
+                "USER_CACHE_VERSION_FILE": str(tmp_path / "user.version"),
+                **config,
+            }
+        )
+        with app.app_context():
+            bind_migrate(app)
+            upgrade(directory=MIGRATIONS)
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+def register(app, username):
+    """A test client logged in as a newly registered ``username``."""
+    client = app.test_client()
+    client.post(
+        "/register",
+        data={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": PASSWORD,
+            "password2": PASSWORD,
+        },
+    )
+    client.post("/login", data={"username": username, "password": PASSWORD})
+    return client
+
+
+def add_plant(client, name, **fields):
+    return client.post(
+        "/plant/add",
+        data={
+            "name": name,
+            "species": "Nephrolepis exaltata",
+            "location": "Hall",
+            "watering_frequency": 3,
+            "sunlight_preference": "partial_shade",
+            **fields,
+        },
+    )
@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import add_plant, register
+
+
+def _follow(client, url):
+    """Every page of ``url``, following ``next`` to the end."""
+    pages = []
+    cursor = None
+    while True:
+        separator = "&" if "?" in url else "?"
+        response = client.get(url + (f"{separator}after={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        pages.append([plant["name"] for plant in response.json["plants"]])
+        cursor = response.json["next"]
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+def client(make_app):
+    app = make_app(DASHBOARD_PAGE_SIZE=2)
+    client = register(app, "ann")
+    for name in ("Fern", "Palm", "Fern Two", "Ivy", "Fern Three"):
+        add_plant(client, name)
+    add_plant(register(app, "bob"), "Fern of Bob")
+    return client
+
+
+def test_plants_pages_follow_the_cursor_to_the_end(client):
+    assert _follow(client, "/api/v1/plants") == [
+        ["Fern", "Palm"],
+        ["Fern Two", "Ivy"],
+        ["Fern Three"],
+    ]
+
+
+def test_ranked_search_pages_cover_every_match(client):
+    pages = _follow(client, "/api/v1/plants?q=fern")
+    assert [len(page) for page in pages] == [2, 1]
+    assert sorted(sum(pages, [])) == ["Fern", "Fern Three", "Fern Two"]
+
+
+def test_plants_rejects_a_bad_cursor(client):
+    assert client.get("/api/v1/plants?after=x").status_code == 400
@@ -0,0 +1,51 @@
+import gzip
+
+import brotli
+import pytest
+
+import assets
+
+CSS = b"body { color: green; }\n" * 50
+
+
+@pytest.fixture
+def static_app(app, tmp_path):
+    static = tmp_path / "static"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "site.css").write_bytes(CSS)
+    app.static_folder = str(static)
+    assets.build(app.static_folder)
+    app.extensions["assets"].load()
+    with app.test_request_context():
+        url = app.url_for("static", filename="css/site.css")
+    return app.test_client(), url
+
+
+@pytest.mark.parametrize(
+    "accept, encoding",
+    [
+        ("br, gzip", "br"),
+        ("br;q=0, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("identity", None),
+        ("*", "br"),
+        ("*, br;q=0", "gzip"),
+    ],
+)
+def test_serves_only_an_accepted_encoding(static_app, accept, encoding):
+    client, url = static_app
+    response = client.get(url, headers={"Accept-Encoding": accept})
+    assert response.headers.get("Content-Encoding") == encoding
+    decode = {"br": brotli.decompress, "gzip": gzip.decompress}.get(
+        encoding, lambda body: body
+    )
+    assert decode(response.get_data()) == CSS
+
+
+def test_rebuild_adds_missing_variants(tmp_path):
+    (tmp_path / "site.css").write_bytes(CSS)
+    hashed = assets.build(str(tmp_path))["site.css"]
+    brotli_file = tmp_path / assets.DIST_DIR / f"{hashed}.br"
+    brotli_file.unlink()
+    assets.build(str(tmp_path))
+    assert brotli.decompress(brotli_file.read_bytes()) == CSS
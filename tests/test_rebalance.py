@@ -0,0 +1,79 @@
+import sqlalchemy as sa
+
+import rebalance
+import sharding
+from conftest import add_plant, register
+from models import db, Plant, User
+
+
+def _shard_of(app, username):
+    with app.app_context():
+        return db.session.scalar(sa.select(User.shard).where(User.username == username))
+
+
+def _plant_names(app, username):
+    """Names of ``username``'s plants in every shard, by shard."""
+    with app.app_context():
+        user_id = db.session.scalar(sa.select(User.id).where(User.username == username))
+        names = {}
+        for index in sharding.shards():
+            with sharding.shard_engine(index).connect() as conn:
+                names[index] = sorted(
+                    conn.scalars(
+                        sa.select(Plant.__table__.c.name).where(
+                            Plant.__table__.c.user_id == user_id
+                        )
+                    )
+                )
+        return names, user_id
+
+
+def _during_copy(monkeypatch, action):
+    """Run ``action`` once, while ``move_user`` is copying the first time."""
+    copy = rebalance._copy_plants
+    calls = []
+
+    def copy_then_act(*args, **kwargs):
+        id_map = copy(*args, **kwargs)
+        if not calls:
+            calls.append(action())
+        return id_map
+
+    monkeypatch.setattr(rebalance, "_copy_plants", copy_then_act)
+    return calls
+
+
+def test_move_leaves_source_shard_writable(make_app, monkeypatch):
+    # A short busy timeout turns a write lock held for the whole copy into a
+    # failed request instead of a slow test.
+    app = make_app(shards=2, SQLITE_BUSY_TIMEOUT_MS=200)
+    ann = register(app, "ann")
+    register(app, "bob")
+    cat = register(app, "cat")
+    add_plant(ann, "Fern")
+    assert _shard_of(app, "ann") == _shard_of(app, "cat") == 0
+
+    responses = _during_copy(monkeypatch, lambda: add_plant(cat, "Cactus"))
+    _, ann_id = _plant_names(app, "ann")
+    with app.app_context():
+        assert rebalance.move_user(ann_id, 1) == 1
+
+    assert responses[0].status_code == 302
+    assert _plant_names(app, "cat")[0] == {0: ["Cactus"], 1: []}
+    assert _plant_names(app, "ann")[0] == {0: [], 1: ["Fern"]}
+
+
+def test_move_recopies_writes_made_during_the_copy(make_app, monkeypatch):
+    app = make_app(shards=2)
+    ann = register(app, "ann")
+    add_plant(ann, "Fern")
+
+    responses = _during_copy(monkeypatch, lambda: add_plant(ann, "Palm"))
+    _, ann_id = _plant_names(app, "ann")
+    with app.app_context():
+        assert rebalance.move_user(ann_id, 1) == 2
+
+    assert responses[0].status_code == 302
+    assert _plant_names(app, "ann")[0] == {0: [], 1: ["Fern", "Palm"]}
+    assert add_plant(ann, "Ivy").status_code == 302
+    assert _plant_names(app, "ann")[0] == {0: [], 1: ["Fern", "Ivy", "Palm"]}
@@ -0,0 +1,46 @@
+from datetime import timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, available_timezones
+
+from flask import current_app, g
+from flask_login import current_user
+
+DATETIME_FORMAT = "%Y-%m-%d %I:%M %p"
+
+
+@lru_cache(maxsize=1)
+def choices():
+    return sorted(available_timezones())
+
+
+@lru_cache(maxsize=None)
+def zone(name):
+    """Resolve a zone name once per process."""
+    return ZoneInfo(name)
+
+
+def user_zone():
+    """The current user's zone, resolved once per request."""
+    if "timezone" not in g:
+        name = None
+        if current_user.is_authenticated:
+            name = current_user.timezone
+        g.timezone = zone(name or current_app.config["DEFAULT_TIMEZONE"])
+    return g.timezone
+
+
+def localize(value, tz):
+    """Convert a naive UTC datetime, as stored in the database, to ``tz``."""
+    return value.replace(tzinfo=timezone.utc).astimezone(tz)
+
+
+def localtime(value, fmt=DATETIME_FORMAT):
+    """Jinja filter: format a stored UTC datetime in the user's timezone."""
+    if value is None:
+        return ""
+    return localize(value, user_zone()).strftime(fmt)
+
+
+def init_app(app):
+    app.config.setdefault("DEFAULT_TIMEZONE", "UTC")
+    app.add_template_filter(localtime)
@@ -0,0 +1,367 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy import func, insert, select, update
+
+import carestats
+import dataversion
+from models import db, CareEvent, JournalEntry, Plant, MAX_WATERING_FREQUENCY
+
+# Every record, whatever its kind, is written with the same columns so a
+# collection can round-trip through one CSV or JSONL file.
+FIELDS = [
+    "kind",
+    "ref",
+    "plant_ref",
+    "name",
+    "species",
+    "location",
+    "watering_frequency",
+    "sunlight_preference",
+    "last_watered",
+    "date_added",
+    "event_type",
+    "event_date",
+    "notes",
+    "entry_date",
+    "content",
+]
+SUNLIGHT_PREFERENCES = ("full_sun", "partial_shade", "full_shade")
+CHUNK_SIZE = 500
+
+
+class RecordError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+class ImportResult:
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.plants = 0
+        self.care_events = 0
+        self.journal_entries = 0
+        self.skipped = 0
+        self.errors = []
+
+    def skip(self, error):
+        # Keep memory flat on a file full of bad rows: count them all, but
+        # remember only the first few for the report.
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(error)
+
+    def __str__(self):
+        return (
+            f"Imported {self.plants} plants, {self.care_events} care events and "
+            f"{self.journal_entries} journal entries ({self.skipped} rows skipped)."
+        )
+
+
+def read_records(stream, fmt):
+    """Yield ``(line, dict)`` for each record of a text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line, text in enumerate(stream, start=1):
+            if text.strip():
+                try:
+                    record = json.loads(text)
+                except json.JSONDecodeError as exc:
+                    yield line, RecordError(line, f"invalid JSON: {exc.msg}")
+                    continue
+                if not isinstance(record, dict):
+                    record = RecordError(line, "expected a JSON object")
+                yield line, record
+    else:
+        raise ValueError(f"Unsupported format: {fmt!r}")
+
+
+def _text(record, key, line, required=True, limit=None):
+    value = record.get(key)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise RecordError(line, f"{key} is required")
+    if limit and len(value) > limit:
+        raise RecordError(line, f"{key} is longer than {limit} characters")
+    return value or None
+
+
+def _datetime(record, key, line, default=None):
+    value = record.get(key)
+    if value in (None, ""):
+        return default
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise RecordError(line, f"{key} is not an ISO 8601 date") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _frequency(record, line):
+    value = record.get("watering_frequency")
+    # JSON gives bools and floats, which int() would quietly truncate.
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise RecordError(line, "watering_frequency must be a whole number")
+    try:
+        frequency = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RecordError(line, "watering_frequency must be a whole number")
+    if not 1 <= frequency <= MAX_WATERING_FREQUENCY:
+        raise RecordError(
+            line,
+            f"watering_frequency must be between 1 and {MAX_WATERING_FREQUENCY}",
+        )
+    return frequency
+
+
+def validate(records, now=None):
+    """Turn raw records into ``(kind, line, values)`` ready for insertion.
+
+    Invalid rows are yielded as ``RecordError`` instances so the caller can
+    report them and carry on.
+    """
+    now = now or datetime.utcnow()
+    for line, record in records:
+        if isinstance(record, RecordError):
+            yield "error", line, record
+            continue
+        try:
+            kind = _text(record, "kind", line)
+            if kind == "plant":
+                frequency = _frequency(record, line)
+                sunlight = _text(record, "sunlight_preference", line)
+                if sunlight not in SUNLIGHT_PREFERENCES:
+                    raise RecordError(line, f"unknown sunlight_preference {sunlight!r}")
+                plant = Plant(
+                    name=_text(record, "name", line, limit=100),
+                    species=_text(record, "species", line, limit=100),
+                    location=_text(record, "location", line, limit=100),
+                    watering_frequency=frequency,
+                    sunlight_preference=sunlight,
+                    last_watered=_datetime(record, "last_watered", line),
+                )
+                plant.update_next_watering_due()
+                values = {
+                    "name": plant.name,
+                    "species": plant.species,
+                    "location": plant.location,
+                    "watering_frequency": plant.watering_frequency,
+                    "sunlight_preference": plant.sunlight_preference,
+                    "last_watered": plant.last_watered,
+                    "next_watering_due": plant.next_watering_due,
+                    "date_added": _datetime(record, "date_added", line, now),
+                }
+                yield kind, line, (_text(record, "ref", line, False), values)
+            elif kind == "care_event":
+                event_type = _text(record, "event_type", line)
+                if event_type not in carestats.EVENT_TYPES:
+                    raise RecordError(line, f"unknown event_type {event_type!r}")
+                values = {
+                    "event_type": event_type,
+                    "event_date": _datetime(record, "event_date", line, now),
+                    "notes": _text(record, "notes", line, False),
+                }
+                yield kind, line, (_text(record, "plant_ref", line), values)
+            elif kind == "journal_entry":
+                values = {
+                    "content": _text(record, "content", line),
+                    "entry_date": _datetime(record, "entry_date", line, now),
+                }
+                yield kind, line, (_text(record, "plant_ref", line), values)
+            else:
+                raise RecordError(line, f"unknown kind {kind!r}")
+        except RecordError as exc:
+            yield "error", line, exc
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Importer:
+    """Insert validated records for one user in bounded, batched transactions."""
+
+    def __init__(self, user_id, chunk_size=CHUNK_SIZE):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.plant_ids = {}
+        self.result = ImportResult()
+
+    def run(self, stream, fmt):
+        # Records may refer to plants the user already has by name.
+        for plant_id, name in db.session.execute(
+            select(Plant.id, Plant.name).where(Plant.user_id == self.user_id)
+        ):
+            self.plant_ids.setdefault(name, plant_id)
+
+        for chunk in _chunks(validate(read_records(stream, fmt)), self.chunk_size):
+            self._insert_chunk(chunk)
+            db.session.commit()
+        return self.result
+
+    def _insert_chunk(self, chunk):
+        dataversion.bump(self.user_id)
+        plants, events, entries = [], [], []
+        for kind, line, payload in chunk:
+            if kind == "error":
+                self.result.skip(payload)
+            elif kind == "plant":
+                plants.append(payload)
+            elif kind == "care_event":
+                events.append((line, payload))
+            else:
+                entries.append((line, payload))
+
+        if plants:
+            rows = [dict(values, user_id=self.user_id) for _, values in plants]
+            ids = db.session.scalars(
+                insert(Plant).returning(Plant.id, sort_by_parameter_order=True),
+                rows,
+            ).all()
+            for (ref, values), plant_id in zip(plants, ids):
+                self.plant_ids[ref or values["name"]] = plant_id
+            self.result.plants += len(ids)
+
+        event_rows = self._resolve(events)
+        if event_rows:
+            db.session.execute(insert(CareEvent), event_rows)
+            self.result.care_events += len(event_rows)
+            self._refresh_plants({row["plant_id"] for row in event_rows})
+
+        entry_rows = self._resolve(entries)
+        if entry_rows:
+            db.session.execute(insert(JournalEntry), entry_rows)
+            self.result.journal_entries += len(entry_rows)
+
+    def _resolve(self, records):
+        rows = []
+        for line, (plant_ref, values) in records:
+            plant_id = self.plant_ids.get(plant_ref)
+            if plant_id is None:
+                self.result.skip(RecordError(line, f"unknown plant_ref {plant_ref!r}"))
+            else:
+                rows.append(dict(values, plant_id=plant_id))
+        return rows
+
+    def _refresh_plants(self, plant_ids):
+        latest = (
+            select(CareEvent.plant_id, func.max(CareEvent.event_date).label("latest"))
+            .where(
+                CareEvent.plant_id.in_(plant_ids), CareEvent.event_type == "watering"
+            )
+            .group_by(CareEvent.plant_id)
+            .subquery()
+        )
+        updates = []
+        for plant in db.session.execute(
+            select(
+                Plant.id, Plant.watering_frequency, Plant.last_watered, latest.c.latest
+            ).join(latest, latest.c.plant_id == Plant.id)
+        ):
+            watered = Plant(
+                last_watered=max(plant.latest, plant.last_watered or plant.latest),
+                watering_frequency=plant.watering_frequency,
+            )
+            watered.update_next_watering_due()
+            updates.append(
+                {
+                    "id": plant.id,
+                    "last_watered": watered.last_watered,
+                    "next_watering_due": watered.next_watering_due,
+                }
+            )
+        if updates:
+            db.session.execute(update(Plant), updates)
+        carestats.rebuild(plant_ids)
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def export_records(user_id, batch_size=CHUNK_SIZE):
+    """Yield every record of a user's collection, reading in batches."""
+    plants = (
+        select(Plant)
+        .where(Plant.user_id == user_id)
+        .order_by(Plant.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for plant in db.session.scalars(plants):
+        yield {
+            "kind": "plant",
+            "ref": str(plant.id),
+            "name": plant.name,
+            "species": plant.species,
+            "location": plant.location,
+            "watering_frequency": plant.watering_frequency,
+            "sunlight_preference": plant.sunlight_preference,
+            "last_watered": _isoformat(plant.last_watered),
+            "date_added": _isoformat(plant.date_added),
+        }
+        db.session.expunge(plant)
+
+    owned = select(Plant.id).where(Plant.user_id == user_id)
+    events = (
+        select(
+            CareEvent.plant_id,
+            CareEvent.event_type,
+            CareEvent.event_date,
+            CareEvent.notes,
+        )
+        .where(CareEvent.plant_id.in_(owned))
+        .order_by(CareEvent.plant_id, CareEvent.event_date)
+        .execution_options(yield_per=batch_size)
+    )
+    for event in db.session.execute(events):
+        yield {
+            "kind": "care_event",
+            "plant_ref": str(event.plant_id),
+            "event_type": event.event_type,
+            "event_date": _isoformat(event.event_date),
+            "notes": event.notes,
+        }
+
+    entries = (
+        select(JournalEntry.plant_id, JournalEntry.entry_date, JournalEntry.content)
+        .where(JournalEntry.plant_id.in_(owned))
+        .order_by(JournalEntry.plant_id, JournalEntry.entry_date)
+        .execution_options(yield_per=batch_size)
+    )
+    for entry in db.session.execute(entries):
+        yield {
+            "kind": "journal_entry",
+            "plant_ref": str(entry.plant_id),
+            "entry_date": _isoformat(entry.entry_date),
+            "content": entry.content,
+        }
+
+
+def write_records(records, fmt):
+    """Serialize records lazily, yielding one chunk of text per record."""
+    if fmt == "jsonl":
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,320 @@
+import hashlib
+import os
+import re
+import secrets
+import tempfile
+from datetime import datetime
+from itertools import islice
+
+from werkzeug.utils import secure_filename
+
+import sharding
+from images import DERIVATIVE_FORMATS, DERIVATIVE_WIDTHS, derivative_name, iter_uploads
+from models import db, JournalEntry, PendingUpload, Plant, StoredFile
+
+CHUNK_SIZE = 64 * 1024
+PENDING_DIR = "incoming"
+SWEEP_BATCH_SIZE = 500
+
+# Content-addressed names look like "ab/cd/<sha256>.<ext>"; anything else is a
+# legacy upload named after its upload time.
+HASHED_NAME = re.compile(r"^(?:derived/)?[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.")
+
+
+def content_hash(filename):
+    match = HASHED_NAME.match(filename)
+    return match.group(1) if match else None
+
+
+def _extension(client_filename):
+    _, ext = os.path.splitext(secure_filename(client_filename or ""))
+    ext = ext.lower().lstrip(".")
+    return "jpg" if ext == "jpeg" else ext
+
+
+def save_upload(file, upload_folder):
+    """Stream an upload to disk while hashing it and store it under its digest.
+
+    Returns ``(filename, size)``, the filename relative to ``upload_folder``.
+    Identical content resolves to the same file, so a re-upload costs no extra
+    disk space. The file is registered in the caller's transaction.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        filename = _store(
+            upload_folder,
+            tmp_path,
+            digest.hexdigest(),
+            _extension(file.filename),
+            size,
+        )
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename, size
+
+
+def _store(upload_folder, tmp_path, hexdigest, ext, size):
+    """Move a complete temporary file to its content-addressed name."""
+    filename = f"{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}"
+    if ext:
+        filename = f"{filename}.{ext}"
+
+    # Register the file before looking at the disk. That write waits for any
+    # sweep that is deleting the same row, and a sweep removes files before it
+    # commits, so an existing file is never one that is about to go.
+    mark_stored(filename, size)
+    target = os.path.join(upload_folder, filename)
+    if os.path.exists(target):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+    return filename
+
+
+def mark_stored(filename, size=0):
+    """Record that ``filename`` was just stored, in the caller's transaction.
+
+    Called by the store itself; a file must be marked before it is used.
+    """
+    if not filename:
+        return
+    result = db.session.execute(
+        db.update(StoredFile)
+        .where(StoredFile.filename == filename)
+        .values(stored_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        db.session.add(StoredFile(filename=filename, size=size))
+
+
+def _remove_files(upload_folder, filename):
+    paths = [filename] + [
+        derivative_name(filename, size, ext)
+        for size in DERIVATIVE_WIDTHS
+        for ext in DERIVATIVE_FORMATS
+    ]
+    for path in paths:
+        try:
+            os.remove(os.path.join(upload_folder, path))
+        except FileNotFoundError:
+            pass
+
+
+def sweep_orphans(upload_folder, before, batch_size=SWEEP_BATCH_SIZE):
+    """Delete stored files that no plant or journal entry refers to any more.
+
+    Walks ``StoredFile`` in keyset batches, one short transaction each, so
+    deletes elsewhere (including database cascades) never have to track
+    files. Files stored after ``before`` are skipped: the row that will refer
+    to them may not be committed yet, and attaching a file always marks it
+    stored. Files are removed before the deletes commit, while an upload of
+    the same content still waits for the row. Returns the number of files
+    removed.
+    """
+    removed = 0
+    last = ""
+    while True:
+        batch = db.session.scalars(
+            db.select(StoredFile.filename)
+            .where(StoredFile.filename > last)
+            .order_by(StoredFile.filename)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return removed
+        last = batch[-1]
+
+        # The references may be in any shard.
+        referenced = set()
+        for index in sharding.shards():
+            with sharding.use_shard(index):
+                for model in (Plant, JournalEntry):
+                    referenced.update(
+                        db.session.scalars(
+                            db.select(model.photo_filename).where(
+                                model.photo_filename.in_(batch)
+                            )
+                        )
+                    )
+        orphans = db.session.scalars(
+            db.delete(StoredFile)
+            .where(
+                StoredFile.filename.in_(set(batch) - referenced),
+                StoredFile.stored_at < before,
+            )
+            .returning(StoredFile.filename)
+        ).all()
+        for filename in orphans:
+            _remove_files(upload_folder, filename)
+        db.session.commit()
+        removed += len(orphans)
+
+
+def register_untracked(upload_folder, batch_size=SWEEP_BATCH_SIZE):
+    """Add a ``StoredFile`` row for every upload on disk that has none.
+
+    Uploads saved before files were tracked are otherwise never swept. Each
+    is registered as stored at its modification time, so recent files still
+    get the sweeper's grace period. Returns the number of files registered.
+    """
+    registered = 0
+    names = iter_uploads(upload_folder)
+    while batch := list(islice(names, batch_size)):
+        known = set(
+            db.session.scalars(
+                db.select(StoredFile.filename).where(StoredFile.filename.in_(batch))
+            )
+        )
+        for filename in batch:
+            if filename in known:
+                continue
+            try:
+                stat = os.stat(os.path.join(upload_folder, filename))
+            except FileNotFoundError:
+                continue
+            stored_at = datetime.utcfromtimestamp(stat.st_mtime)
+            db.session.add(
+                StoredFile(
+                    filename=filename,
+                    size=stat.st_size,
+                    created_at=stored_at,
+                    stored_at=stored_at,
+                )
+            )
+            registered += 1
+        db.session.commit()
+    return registered
+
+
+class UploadError(ValueError):
+    """A chunk or upload that cannot be accepted; ``status`` is the HTTP code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _pending_path(upload_folder, upload_id):
+    # The .tmp suffix keeps partial files out of iter_uploads.
+    return os.path.join(upload_folder, PENDING_DIR, f"{upload_id}.tmp")
+
+
+def start_pending(upload_folder, user_id, client_filename, size, sha256):
+    """Begin a resumable upload; the caller commits."""
+    upload = PendingUpload(
+        id=secrets.token_hex(16),
+        user_id=user_id,
+        filename=secure_filename(client_filename) or "upload",
+        size=size,
+        sha256=sha256,
+        offset=0,
+    )
+    path = _pending_path(upload_folder, upload.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    db.session.add(upload)
+    return upload
+
+
+def append_chunk(upload_folder, upload, offset, stream):
+    """Write the chunk read from ``stream`` at ``offset``; the caller commits.
+
+    The chunk is streamed to disk without being held in memory. When the last
+    byte arrives the whole file is checked against the declared SHA-256.
+    """
+    if upload.complete:
+        raise UploadError(409, "Upload is already complete.")
+    if offset != upload.offset:
+        raise UploadError(409, f"Expected offset {upload.offset}.")
+
+    path = _pending_path(upload_folder, upload.id)
+    written = 0
+    with open(path, "r+b") as out:
+        out.seek(offset)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if offset + written > upload.size:
+                out.truncate(offset)
+                raise UploadError(413, "Chunk runs past the declared size.")
+            out.write(chunk)
+        out.truncate()
+
+    # Only advance from the offset this request started at, so a concurrent
+    # duplicate of the same chunk cannot move it twice.
+    result = db.session.execute(
+        db.update(PendingUpload)
+        .where(PendingUpload.id == upload.id, PendingUpload.offset == offset)
+        .values(offset=offset + written)
+    )
+    if result.rowcount == 0:
+        raise UploadError(409, "Upload was modified concurrently.")
+    db.session.refresh(upload)
+
+    if upload.offset == upload.size:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        if digest.hexdigest() != upload.sha256:
+            discard_pending(upload_folder, upload)
+            raise UploadError(422, "Checksum mismatch; start the upload again.")
+        upload.complete = True
+    return upload.offset
+
+
+def get_pending(upload_id, user_id):
+    upload = db.session.get(PendingUpload, upload_id)
+    if upload is None or upload.user_id != user_id:
+        return None
+    return upload
+
+
+def claim_pending(upload_folder, upload):
+    """Move a completed upload into the store; returns ``(filename, size)``.
+
+    Registers the file and deletes the pending row in the caller's
+    transaction.
+    """
+    filename = _store(
+        upload_folder,
+        _pending_path(upload_folder, upload.id),
+        upload.sha256,
+        _extension(upload.filename),
+        upload.size,
+    )
+    db.session.delete(upload)
+    return filename, upload.size
+
+
+def discard_pending(upload_folder, upload):
+    try:
+        os.remove(_pending_path(upload_folder, upload.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(upload)
+
+
+def expire_pending(upload_folder, before):
+    """Discard uploads started before ``before`` and never attached."""
+    expired = PendingUpload.query.filter(PendingUpload.created_at < before).all()
+    for upload in expired:
+        discard_pending(upload_folder, upload)
+    db.session.commit()
+    return len(expired)
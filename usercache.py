@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models import db, User
+
+
+class UserCache:
+    """Bounded, TTL-based cache in front of the Flask-Login user loader.
+
+    Entries are column snapshots rather than ORM instances, so nothing is
+    shared between request sessions. A version stamp file shared by every
+    worker process is touched after any commit that changes a user; a process
+    that sees a newer stamp drops its whole cache.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("USER_CACHE_SIZE", 1024)
+        app.config.setdefault("USER_CACHE_TTL", 60)
+        app.config.setdefault(
+            "USER_CACHE_VERSION_FILE", os.path.join(app.instance_path, "user.version")
+        )
+        self.maxsize = app.config["USER_CACHE_SIZE"]
+        self.ttl = app.config["USER_CACHE_TTL"]
+        self.version_file = app.config["USER_CACHE_VERSION_FILE"]
+        os.makedirs(os.path.dirname(self.version_file), exist_ok=True)
+
+        event.listen(User, "after_update", self._mark_changed)
+        event.listen(User, "after_delete", self._mark_changed)
+        event.listen(Session, "after_commit", self._after_commit)
+        app.extensions["user_cache"] = self
+
+    def _current_version(self):
+        try:
+            return os.stat(self.version_file).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump_version(self):
+        with open(self.version_file, "a"):
+            os.utime(self.version_file)
+
+    def _mark_changed(self, mapper, connection, target):
+        inspect(target).session.info["user_cache_dirty"] = True
+
+    def _after_commit(self, session):
+        # Bump only once the change is visible to other processes, so none of
+        # them can re-cache the old row under the new version.
+        if session.info.pop("user_cache_dirty", False):
+            self.bump_version()
+
+    def get(self, user_id):
+        version = self._current_version()
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return self._attach(entry[1])
+            self.misses += 1
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            snapshot = {
+                column.key: getattr(user, column.key)
+                for column in inspect(User).column_attrs
+            }
+            with self._lock:
+                if self._version == version:
+                    self._entries[user_id] = (now + self.ttl, snapshot)
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return user
+
+    def _attach(self, snapshot):
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
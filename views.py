@@ -0,0 +1,557 @@
+import io
+import itertools
+import os
+from datetime import datetime
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    flash,
+    get_flashed_messages,
+    redirect,
+    render_template,
+    request,
+    send_from_directory,
+    stream_template,
+    stream_with_context,
+    url_for,
+)
+from flask_login import current_user, login_required
+from flask_wtf.csrf import generate_csrf
+
+import carestats
+import database
+import dataversion
+import search
+import transfer
+from extensions import metrics, page_cache
+from forms import (
+    BulkCareForm,
+    CareEventForm,
+    DeleteEventForm,
+    ImportForm,
+    JournalEntryForm,
+    PlantForm,
+)
+from images import schedule_derivatives, srcset
+from models import db, CareEvent, JournalEntry, Plant
+from pagination import InvalidCursor, id_page, keyset_page, offset_page
+from uploads import claim_pending, content_hash, get_pending, save_upload
+
+main = Blueprint("main", __name__)
+
+
+@main.app_context_processor
+def inject_photo_srcset():
+    def photo_srcset(filename, ext):
+        return srcset(
+            lambda name: url_for("main.uploaded_file", filename=name),
+            current_app.config["UPLOAD_FOLDER"],
+            filename,
+            ext,
+        )
+
+    return {"photo_srcset": photo_srcset}
+
+
+def care_event_timeline(session, plant_id, before=None):
+    try:
+        events, cursor = keyset_page(
+            session.query(CareEvent).filter_by(plant_id=plant_id),
+            CareEvent.event_date,
+            CareEvent.id,
+            cursor=before,
+            limit=current_app.config["TIMELINE_PAGE_SIZE"],
+        )
+    except InvalidCursor:
+        abort(400)
+    return events, cursor
+
+
+def journal_timeline(session, plant_id, before=None):
+    try:
+        entries, cursor = keyset_page(
+            session.query(JournalEntry).filter_by(plant_id=plant_id),
+            JournalEntry.entry_date,
+            JournalEntry.id,
+            cursor=before,
+            limit=current_app.config["TIMELINE_PAGE_SIZE"],
+        )
+    except InvalidCursor:
+        abort(400)
+    return entries, cursor
+
+
+def store_form_photo(form):
+    """Store the form's photo, sent either in chunks beforehand or with the form.
+
+    Returns the stored filename, or None if there is no photo. The file is
+    registered in the caller's transaction.
+    """
+    if form.upload_id.data:
+        upload = get_pending(form.upload_id.data, current_user.id)
+        filename, size = claim_pending(current_app.config["UPLOAD_FOLDER"], upload)
+    elif form.photo.data:
+        filename, size = save_upload(
+            form.photo.data, current_app.config["UPLOAD_FOLDER"]
+        )
+        metrics.inc("upload_bytes_total", size, via="form")
+    else:
+        return None
+    metrics.observe("upload_size_bytes", size)
+    schedule_derivatives(current_app._get_current_object(), filename)
+    return filename
+
+
+@main.route("/uploads/<path:filename>")
+def uploaded_file(filename):
+    # Content-addressed files never change, so they can be cached forever and
+    # their digest is a strong validator.
+    if content_hash(filename) is None:
+        return send_from_directory(current_app.config["UPLOAD_FOLDER"], filename)
+
+    response = send_from_directory(
+        current_app.config["UPLOAD_FOLDER"],
+        filename,
+        etag=os.path.basename(filename),
+        max_age=current_app.config["UPLOAD_CACHE_MAX_AGE"],
+    )
+    response.cache_control.immutable = True
+    return response
+
+
+@main.route("/")
+def index():
+    if current_user.is_authenticated:
+        return redirect(url_for("main.dashboard"))
+    return render_template("landing.html")
+
+
+@main.route("/dashboard")
+@login_required
+@page_cache.cached
+def dashboard():
+    search_args = dashboard_search_args()
+    bulk_form = BulkCareForm(**search_args)
+    context = dict(
+        bulk_form=bulk_form,
+        now=datetime.utcnow(),
+        search_args=search_args,
+        search_query=search_args.get("q", ""),
+        search_species=search_args.get("species", ""),
+        search_location=search_args.get("location", ""),
+    )
+
+    if request.args.get("all"):
+        # The session cookie goes out before the body, so make the session
+        # changes the page would make while it is rendered now.
+        generate_csrf()
+        get_flashed_messages()
+        rows = stream_plants(search_args)
+        first = next(rows, None)
+        plants = [] if first is None else itertools.chain([first], rows)
+        return stream_template("dashboard.html", plants=plants, **context)
+
+    query = dashboard_query(database.read_session(), search_args)
+    plants, cursor = dashboard_page(query, search_args)
+    return render_template("dashboard.html", plants=plants, cursor=cursor, **context)
+
+
+@main.route("/dashboard/plants")
+@login_required
+@page_cache.cached
+def dashboard_plants():
+    search_args = dashboard_search_args()
+    query = dashboard_query(database.read_session(), search_args)
+    plants, cursor = dashboard_page(query, search_args)
+    return render_template(
+        "_plant_cards.html",
+        plants=plants,
+        cursor=cursor,
+        now=datetime.utcnow(),
+        search_args=search_args,
+    )
+
+
+def dashboard_search_args():
+    # Only the filters in use, so links to further pages stay short.
+    args = {
+        name: request.args.get(name, "").strip()
+        for name in ("q", "species", "location")
+    }
+    return {name: value for name, value in args.items() if value}
+
+
+def dashboard_query(session, search_args):
+    return search.apply_search(
+        session.query(Plant)
+        .filter_by(user_id=current_user.id)
+        .outerjoin(Plant.care_stats)
+        .options(db.contains_eager(Plant.care_stats)),
+        current_user.id,
+        **search_args,
+        backend=search.current_backend(),
+    )
+
+
+def dashboard_page(query, search_args):
+    after = request.args.get("after")
+    limit = current_app.config["DASHBOARD_PAGE_SIZE"]
+    try:
+        if search.is_ranked(search_args.get("q", ""), search.current_backend()):
+            # Relevance has no column to seek on, and a search matches few
+            # enough plants that skipping earlier pages is cheap.
+            return offset_page(query, after, limit)
+        return id_page(query, Plant.id, after, limit)
+    except InvalidCursor:
+        abort(400)
+
+
+def stream_plants(search_args):
+    """Yield every matching plant, fetching a page's worth of rows at a time."""
+    session = database.stream_session()
+    try:
+        query = dashboard_query(session, search_args)
+        if not search.is_ranked(search_args.get("q", ""), search.current_backend()):
+            query = query.order_by(Plant.id)
+        yield from query.yield_per(current_app.config["DASHBOARD_PAGE_SIZE"])
+    finally:
+        session.close()
+
+
+@main.route("/import", methods=["GET", "POST"])
+@login_required
+def import_collection():
+    form = ImportForm()
+    if form.validate_on_submit():
+        file = form.file.data
+        fmt = os.path.splitext(file.filename)[1].lstrip(".").lower()
+        stream = io.TextIOWrapper(file.stream, encoding="utf-8-sig", newline="")
+        try:
+            result = transfer.Importer(current_user.id).run(stream, fmt)
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash("The file must be UTF-8 encoded.", "danger")
+            return render_template("import.html", form=form)
+        flash(str(result), "success" if not result.skipped else "warning")
+        return render_template("import.html", form=form, result=result)
+    return render_template("import.html", form=form)
+
+
+@main.route("/export.<any(csv, jsonl):fmt>")
+@login_required
+def export_collection(fmt):
+    records = transfer.export_records(current_user.id)
+    return Response(
+        stream_with_context(transfer.write_records(records, fmt)),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=plants.{fmt}"},
+    )
+
+
+@main.route("/plant/add", methods=["GET", "POST"])
+@login_required
+def add_plant():
+    form = PlantForm()
+    if form.validate_on_submit():
+        filename = store_form_photo(form)
+
+        plant = Plant(
+            name=form.name.data,
+            species=form.species.data,
+            location=form.location.data,
+            photo_filename=filename,
+            watering_frequency=form.watering_frequency.data,
+            sunlight_preference=form.sunlight_preference.data,
+            user_id=current_user.id,
+        )
+        db.session.add(plant)
+        dataversion.bump(current_user.id)
+        db.session.commit()
+        flash("Plant added successfully!", "success")
+        return redirect(url_for("main.dashboard"))
+    return render_template("add_plant.html", form=form)
+
+
+@main.route("/plant/<int:id>")
+@login_required
+@page_cache.cached
+def plant_detail(id):
+    read = database.read_session()
+    plant = read.get(Plant, id)
+    if plant is None:
+        abort(404)
+    if plant.user_id != current_user.id:
+        flash("You do not have permission to view this plant.", "danger")
+        return redirect(url_for("main.dashboard"))
+
+    care_events, care_cursor = care_event_timeline(read, id)
+    journal_entries, journal_cursor = journal_timeline(read, id)
+
+    delete_form = DeleteEventForm()
+    care_form = CareEventForm()  # 👈 add this
+    journal_form = JournalEntryForm()  # 👈 add this
+
+    return render_template(
+        "plant_detail.html",
+        plant=plant,
+        care_events=care_events,
+        care_cursor=care_cursor,
+        journal_entries=journal_entries,
+        journal_cursor=journal_cursor,
+        delete_form=delete_form,
+        care_form=care_form,
+        journal_form=journal_form,
+        form=care_form,
+    )
+
+
+@main.route("/plant/<int:id>/care_events")
+@login_required
+def care_event_page(id):
+    read = database.read_session()
+    plant = read.get(Plant, id)
+    if plant is None or plant.user_id != current_user.id:
+        abort(404)
+
+    care_events, care_cursor = care_event_timeline(read, id, request.args.get("before"))
+    return render_template(
+        "_care_events.html",
+        plant=plant,
+        care_events=care_events,
+        care_cursor=care_cursor,
+        delete_form=DeleteEventForm(),
+    )
+
+
+@main.route("/plant/<int:id>/journal_entries")
+@login_required
+def journal_entry_page(id):
+    read = database.read_session()
+    plant = read.get(Plant, id)
+    if plant is None or plant.user_id != current_user.id:
+        abort(404)
+
+    journal_entries, journal_cursor = journal_timeline(
+        read, id, request.args.get("before")
+    )
+    return render_template(
+        "_journal_entries.html",
+        plant=plant,
+        journal_entries=journal_entries,
+        journal_cursor=journal_cursor,
+        delete_form=DeleteEventForm(),
+    )
+
+
+@main.route("/plant/<int:id>/edit", methods=["GET", "POST"])
+@login_required
+def edit_plant(id):
+    plant = Plant.query.get_or_404(id)
+    if plant.user_id != current_user.id:
+        flash("You do not have permission to edit this plant.", "danger")
+        return redirect(url_for("main.dashboard"))
+
+    form = PlantForm(obj=plant)
+    if form.validate_on_submit():
+        plant.name = form.name.data
+        plant.species = form.species.data
+        plant.location = form.location.data
+        plant.watering_frequency = form.watering_frequency.data
+        plant.sunlight_preference = form.sunlight_preference.data
+        plant.update_next_watering_due()
+
+        filename = store_form_photo(form)
+        if filename:
+            plant.photo_filename = filename
+
+        dataversion.bump(current_user.id)
+        db.session.commit()
+        flash("Plant updated successfully!", "success")
+        return redirect(url_for("main.plant_detail", id=plant.id))
+
+    return render_template("edit_plant.html", form=form, plant=plant)
+
+
+@main.route("/journal_entry/delete/<int:entry_id>", methods=["POST"])
+@login_required
+def delete_journal_entry(entry_id):
+    entry = JournalEntry.query.get_or_404(entry_id)
+    if entry.plant.user_id != current_user.id:
+        flash("You do not have permission to delete this journal entry.", "danger")
+        return redirect(url_for("main.dashboard"))
+
+    db.session.delete(entry)
+    dataversion.bump(current_user.id)
+    db.session.commit()
+    flash("Journal entry deleted successfully!", "success")
+    return redirect(request.referrer or url_for("main.dashboard"))
+
+
+@main.route("/plant/<int:id>/delete", methods=["POST"])
+@login_required
+def delete_plant(id):
+    plant = Plant.query.get_or_404(id)
+    if plant.user_id != current_user.id:
+        flash("You do not have permission to delete this plant.", "danger")
+        return redirect(url_for("main.dashboard"))
+
+    # Care events, journal entries and stats go by ON DELETE CASCADE; the
+    # upload sweeper reclaims photos nothing refers to any more.
+    db.session.delete(plant)
+    dataversion.bump(current_user.id)
+    db.session.commit()
+    flash("Plant deleted successfully!", "success")
+    return redirect(url_for("main.dashboard"))
+
+
+@main.route("/care_event/delete/<int:event_id>", methods=["POST"])
+@login_required
+def delete_care_event(event_id):
+    form = DeleteEventForm()
+    if form.validate_on_submit():  # <-- ensures CSRF token is valid
+        event = CareEvent.query.get_or_404(event_id)
+        if event.plant.user_id != current_user.id:
+            flash("You do not have permission to delete this event.", "danger")
+            return redirect(url_for("main.dashboard"))
+
+        db.session.delete(event)
+        db.session.flush()
+        carestats.remove_event(event)
+        dataversion.bump(current_user.id)
+        db.session.commit()
+        flash("Care event deleted successfully!", "success")
+    else:
+        flash("Invalid request.", "danger")
+
+    return redirect(request.referrer or url_for("main.dashboard"))
+
+
+@main.route("/plant/<int:id>/add_care_event", methods=["POST"])
+@login_required
+def add_care_event(id):
+    plant = Plant.query.get_or_404(id)
+    if plant.user_id != current_user.id:
+        flash("You do not have permission to add care events to this plant.", "danger")
+        return redirect(url_for("main.dashboard"))
+
+    form = CareEventForm()
+    if form.validate_on_submit():
+        care_event = CareEvent(
+            plant_id=id,
+            event_type=form.event_type.data,
+            notes=form.notes.data,
+            event_date=datetime.utcnow(),
+        )
+        db.session.add(care_event)
+        carestats.record_event(plant.id, care_event.event_type, care_event.event_date)
+
+        if form.event_type.data == "watering":
+            plant.last_watered = care_event.event_date
+            plant.update_next_watering_due()
+
+        dataversion.bump(current_user.id)
+        db.session.commit()
+        flash("Care event added successfully!", "success")
+
+    return redirect(url_for("main.plant_detail", id=id))
+
+
+@main.route("/plants/care", methods=["POST"])
+@login_required
+def bulk_care_event():
+    form = BulkCareForm()
+    filters = {
+        "q": form.q.data or "",
+        "species": form.species.data or "",
+        "location": form.location.data or "",
+    }
+    dashboard_url = url_for(
+        "main.dashboard", **{name: value for name, value in filters.items() if value}
+    )
+    if not form.validate_on_submit():
+        flash("Choose a care event type to apply.", "danger")
+        return redirect(dashboard_url)
+
+    query = db.session.query(Plant.id, Plant.watering_frequency).filter(
+        Plant.user_id == current_user.id
+    )
+    if form.apply_matching.data:
+        query = search.apply_search(
+            query, current_user.id, **filters, backend=search.current_backend()
+        )
+    else:
+        query = query.filter(Plant.id.in_(form.plant_ids.data))
+    plants = query.all()
+    if not plants:
+        flash("No plants selected.", "warning")
+        return redirect(dashboard_url)
+
+    # One multi-row insert and one executemany update, whatever the count.
+    event_date = datetime.utcnow()
+    event_type = form.event_type.data
+    db.session.execute(
+        db.insert(CareEvent),
+        [
+            {
+                "plant_id": plant.id,
+                "event_type": event_type,
+                "notes": form.notes.data,
+                "event_date": event_date,
+            }
+            for plant in plants
+        ],
+    )
+    if event_type == "watering":
+        updates = []
+        for plant in plants:
+            watered = Plant(
+                last_watered=event_date, watering_frequency=plant.watering_frequency
+            )
+            watered.update_next_watering_due()
+            updates.append(
+                {
+                    "id": plant.id,
+                    "last_watered": watered.last_watered,
+                    "next_watering_due": watered.next_watering_due,
+                }
+            )
+        db.session.execute(db.update(Plant), updates)
+    carestats.rebuild([plant.id for plant in plants])
+
+    dataversion.bump(current_user.id)
+    db.session.commit()
+    label = dict(form.event_type.choices)[event_type].lower()
+    flash(
+        f"Logged {label} for {len(plants)} plant{'s' if len(plants) != 1 else ''}.",
+        "success",
+    )
+    return redirect(dashboard_url)
+
+
+@main.route("/plant/<int:id>/add_journal_entry", methods=["GET", "POST"])
+@login_required
+def add_journal_entry(id):
+    plant = Plant.query.get_or_404(id)
+    if plant.user_id != current_user.id:
+        flash(
+            "You do not have permission to add journal entries to this plant.", "danger"
+        )
+        return redirect(url_for("main.dashboard"))
+
+    form = JournalEntryForm()
+    if form.validate_on_submit():
+        filename = store_form_photo(form)
+
+        journal_entry = JournalEntry(
+            plant_id=id, content=form.content.data, photo_filename=filename
+        )
+        db.session.add(journal_entry)
+        dataversion.bump(current_user.id)
+        db.session.commit()
+        flash("Journal entry added successfully!", "success")
+        return redirect(url_for("main.plant_detail", id=id))
+
+    return render_template("add_journal_entry.html", form=form, plant=plant)